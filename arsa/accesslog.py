@@ -0,0 +1,58 @@
+""" Structured access logging """
+import sys
+import json
+import random
+import threading
+
+class AccessLogger(object):
+    """
+        Buffers access log records in memory and writes them as JSON lines.
+
+        Without ``flush_interval`` the buffer is written once at the end of
+        every invocation (or request under `arsa run`). With an interval a
+        background thread writes it instead, keeping the encoding and the
+        write off the request path. Successful requests are kept with
+        probability ``sample_rate``, errors are always kept.
+    """
+
+    def __init__(self, stream=None, sample_rate=1.0, flush_interval=None, max_buffer=1000):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+        if flush_interval:
+            self._thread = threading.Thread(target=self._run, name='arsa-access-log')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def log(self, record):
+        if record['status'] < 400 and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self.flush()
+
+    def end_invocation(self):
+        if self._thread is None:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            records, self._buffer = self._buffer, []
+
+        if records:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+            stream.flush()
+
+    def _run(self):
+        event = threading.Event()
+        while not event.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,407 @@
+""" Frozen application """
+import time
+from functools import partial
+from contextvars import copy_context
+from inspect import isawaitable
+from collections.abc import Iterator
+from werkzeug.routing import Map
+from werkzeug.wrappers import Response
+from werkzeug.http import quote_etag
+from werkzeug.exceptions import HTTPException
+
+from .util import run_sync
+from .codec import get_codec
+from .wrappers import make_request, WSGIRequest
+from .router import Router
+from .routes import CompiledRoute
+from .hooks import compile_hooks
+from .etag import body_etag, is_conditional, etag_matches, not_modified, not_modified_response
+from .events import BatchDispatcher
+from .compression import Compressor
+from .timing import PhaseTimer, NULL_TIMER
+from .exceptions import Redirect
+from .globals import _request_ctx_var
+from .ctx import RequestContext
+
+class Application(object):
+    """
+        Precompiled snapshot of an Arsa configuration. It is built once by
+        `Arsa.freeze` and only read afterwards, so a single instance is
+        shared by every warm invocation and every thread.
+    """
+
+    def __init__(self, config):
+        self.codec = get_codec(config.json_codec)
+        self.routes = Map(rules=[config.factory]).bind('arsa.io')
+        after_hooks = list(reversed(config.after_hooks))
+        # Keyed by endpoint, like the routes of the factory
+        self.compiled = {
+            endpoint: CompiledRoute(
+                route,
+                self.codec,
+                before=compile_hooks(config.before_hooks, route),
+                after=compile_hooks(after_hooks, route),
+                resources=config.resources
+            )
+            for endpoint, route in config.factory.routes.items()
+        }
+        self.router = Router(self.routes)
+        # Hooks that opted in to answer requests no route matched, by path
+        self.unrouted_hooks = tuple(hook for hook in config.before_hooks if hook.unrouted)
+        self.middlewares = tuple(config.middlewares)
+        self.exceptions = tuple(config.exceptions)
+        self.access_log = config.access_log
+        self.metrics = config.metrics
+        self.profiler = config.profiler
+        self.tracer = config.tracer
+        self.memory = config.memory
+        self.resources = config.resources
+        self.teardowns = tuple(config.teardowns)
+        self.timing_hooks = tuple(config.timing_hooks)
+        self.server_timing = config.server_timing
+        self.timing = bool(self.timing_hooks) or self.server_timing
+
+        self.compressor = None
+        if config.compress:
+            self.compressor = Compressor(config.compress_threshold)
+
+        self.batch = None
+        if config.consumers:
+            self.batch = BatchDispatcher(config.consumers, config.batch_workers)
+
+    def __call__(self, environ, start_response):
+        """ WSGI entry point, used by `arsa run` and test clients """
+        if self.memory:
+            self.memory.begin()
+
+        req = WSGIRequest(environ)
+        resp = None
+        try:
+            resp = self.dispatch(req, environ, stream=True)
+            return resp(environ, start_response)
+        finally:
+            self._end_invocation()
+            if self.memory:
+                rule = req.url_rule
+                if resp is not None and resp.is_streamed:
+                    # Measured once the body has been sent
+                    resp.call_on_close(partial(self.memory.end, rule))
+                else:
+                    del req, resp
+                    self.memory.end(rule)
+
+    def handle(self, event, context):
+        """ Lambda entry point, dispatches the proxy event without WSGI """
+        try:
+            if 'Records' in event:
+                if self.batch is None:
+                    raise ValueError('No consumers registered for batch events.')
+                return self.batch.handle(event)
+
+            if self.memory:
+                self.memory.begin()
+            req = make_request(event, context)
+            try:
+                return req.proxy_response(self.dispatch(req))
+            finally:
+                if self.memory:
+                    # Only the proxy response is left, measure what else survived
+                    rule = req.url_rule
+                    del req
+                    self.memory.end(rule)
+        finally:
+            self._end_invocation()
+
+    def _end_invocation(self):
+        if self.access_log:
+            self.access_log.end_invocation()
+        if self.metrics:
+            self.metrics.end_invocation()
+        if self.tracer:
+            self.tracer.flush()
+
+    def dispatch(self, req, environ=None, stream=False):
+        """
+            Run a request through middlewares, routing, validation and the
+            endpoint. Returns a single response object for the request.
+
+            Endpoints returning an iterator are encoded incrementally. With
+            ``stream`` the response is sent chunk by chunk, otherwise it is
+            buffered here so encoding errors still become error responses.
+
+            The request context is always torn down, teardown callbacks get
+            the unhandled exception or None. For streamed responses this
+            happens once the body has been sent.
+        """
+        req.codec = self.codec
+        ctx = RequestContext(req, self.resources)
+        token = _request_ctx_var.set(ctx)
+
+        start = time.perf_counter()
+        streamed = False
+        try:
+            timer = PhaseTimer() if self.timing else NULL_TIMER
+            if self.tracer:
+                ctx.span = self.tracer.start_request(req)
+
+            resp = self._respond(ctx, timer, environ, stream)
+            self._observe(ctx, resp, timer, start)
+            streamed = resp.is_streamed
+            return resp
+        except Exception as unhandled:
+            ctx.error = unhandled
+            if ctx.span:
+                ctx.span.error = repr(unhandled)
+                ctx.span.finish()
+            if self.access_log or self.metrics:
+                duration = (time.perf_counter() - start) * 1000
+                if self.metrics:
+                    self.metrics.record(ctx.rule, ctx.request.method, 500, duration)
+                if self.access_log:
+                    self._log(ctx, 500, None, duration)
+            raise
+        finally:
+            if streamed:
+                # Pooled resources stay lent and errors raised while
+                # streaming reach the teardowns
+                resp.call_on_close(partial(self._close, ctx))
+            else:
+                self._close(ctx)
+            _request_ctx_var.reset(token)
+
+    def _respond(self, ctx, timer, environ, stream):
+        req = ctx.request
+
+        try:
+            resp = self._route(ctx, timer, stream)
+        except Redirect as error:
+            resp = error.get_response(environ)
+        except self.exceptions as error:
+            code = error.code if hasattr(error, 'code') else 400
+            resp = Response(
+                response=self.codec.dumps(error),
+                status=code,
+                mimetype='application/json'
+            )
+        except HTTPException as error:
+            resp = Response(
+                response=self.codec.dumps(error),
+                status=error.code,
+                mimetype='application/json'
+            )
+
+        rule = ctx.rule
+        compiled = None
+        if rule is not None:
+            compiled = self.compiled[rule.endpoint]
+            for hook in compiled.after_hooks:
+                result = hook(rule, resp)
+                if isawaitable(result):
+                    result = run_sync(result)
+                if result is not None:
+                    resp = result
+
+            if is_conditional(req) and not_modified(req, resp):
+                resp = not_modified_response(resp.headers)
+
+        if self.compressor and (compiled is None or compiled.compress):
+            resp = self.compressor(resp, req.headers.get('Accept-Encoding', ''))
+            timer.mark('compress')
+
+        return resp
+
+    def _route(self, ctx, timer, stream):
+        """ Answer a request from a middleware, a before hook, the cache or the endpoint """
+        req = ctx.request
+
+        # Call middlewares, a result answers the request before routing
+        for middleware in self.middlewares:
+            result = middleware()
+            if isawaitable(result):
+                result = run_sync(result)
+            if result is not None:
+                return self._unrouted_response(result)
+        timer.mark('middleware')
+
+        # Find url rule
+        try:
+            (rule, arguments) = self.router.match(req.path, req.method)
+        except HTTPException:
+            result = self._unrouted_hooks(req.path)
+            if result is None:
+                raise
+            return self._unrouted_response(result)
+        ctx.rule = req.url_rule = rule
+        compiled = self.compiled[rule.endpoint]
+        timer.mark('match')
+        if ctx.span:
+            ctx.span.name = '{} {}'.format(req.method, rule.rule)
+            ctx.span.set_attribute('http.route', rule.rule)
+
+        body = None
+        for hook in compiled.before_hooks:
+            body = hook(rule)
+            if isawaitable(body):
+                body = run_sync(body)
+            if body is not None:
+                break
+
+        resp = cache_key = etag = None
+        if body is None and compiled.cache is not None:
+            cache_key = compiled.cache.key(req)
+            resp = compiled.cache.get(cache_key)
+            timer.mark('cache')
+
+        if resp is None:
+            if body is None:
+                compiled.collect_arguments(req, arguments)
+                timer.mark('parse')
+
+                decoded_args = compiled.validate_arguments(arguments)
+                for name in compiled.injections:
+                    decoded_args[name] = ctx.resource(name)
+                timer.mark('validate')
+
+                if compiled.etag is not None and compiled.etag is not True:
+                    etag = compiled.etag(**decoded_args)
+                    if etag is not None and is_conditional(req) and etag_matches(req, etag):
+                        # The client is up to date, skip the endpoint. Other
+                        # methods still run, a matching tag must not drop a write
+                        body = not_modified_response([('ETag', quote_etag(etag))])
+
+                if body is None:
+                    if self.profiler:
+                        body = self.profiler(rule, decoded_args, _call_endpoint)
+                    else:
+                        body = _call_endpoint(rule.endpoint, decoded_args)
+            timer.mark('endpoint')
+
+            resp = _make_response(ctx, compiled, body, stream)
+            if compiled.etag is True:
+                body_etag(resp)
+            elif etag is not None and resp.status_code == 200:
+                resp.set_etag(etag)
+            timer.mark('serialize')
+            if cache_key is not None:
+                compiled.cache.set(cache_key, resp)
+
+        return resp
+
+    def _unrouted_hooks(self, path):
+        """ The first result of the before hooks applying to an unmatched path """
+        for hook in self.unrouted_hooks:
+            if hook.matches(path):
+                result = hook.func(None)
+                if isawaitable(result):
+                    result = run_sync(result)
+                if result is not None:
+                    return result
+        return None
+
+    def _unrouted_response(self, body):
+        """ Encode a value answering a request without a route """
+        if isinstance(body, Response):
+            return body
+        return Response(self.codec.dumps(body), mimetype='application/json')
+
+    def _observe(self, ctx, resp, timer, start):
+        """ Report the finished request to the enabled timing, tracing, metrics and logs """
+        req, rule = ctx.request, ctx.rule
+
+        if self.timing:
+            for hook in self.timing_hooks:
+                hook(rule, timer)
+            if self.server_timing:
+                resp.headers['Server-Timing'] = timer.server_timing()
+
+        if ctx.span:
+            ctx.span.set_attribute('http.method', req.method)
+            ctx.span.set_attribute('http.status_code', resp.status_code)
+            ctx.span.finish()
+
+        if self.access_log or self.metrics:
+            duration = (time.perf_counter() - start) * 1000
+            if self.metrics:
+                self.metrics.record(rule, req.method, resp.status_code, duration)
+
+        if self.access_log:
+            # The size of a streamed body is unknown until it has been sent
+            size = None if resp.is_streamed else resp.calculate_content_length()
+            self._log(ctx, resp.status_code, size, duration)
+
+    def _log(self, ctx, status, size, duration):
+        req, rule = ctx.request, ctx.rule
+        self.access_log.log({
+            "time": time.time(),
+            "requestId": getattr(req, 'request_id', None),
+            "method": req.method,
+            "path": req.path,
+            "route": rule.rule if rule else None,
+            "status": status,
+            "duration": round(duration, 3),
+            "requestBytes": req.content_length or 0,
+            "responseBytes": size
+        })
+
+    def _close(self, ctx):
+        """ Run the teardown callbacks and give pooled resources back """
+        token = _request_ctx_var.set(ctx)
+        try:
+            for callback in self.teardowns:
+                try:
+                    callback(ctx.error)
+                except Exception as teardown_error: # pylint: disable=broad-except
+                    print('Teardown {!r} failed: {!r}\n'.format(callback, teardown_error))
+        finally:
+            ctx.release()
+            _request_ctx_var.reset(token)
+
+def _make_response(ctx, route, body, stream):
+    """ Encode the value returned by an endpoint or before hook """
+    if isinstance(body, Response):
+        return body
+
+    if isinstance(body, Iterator):
+        if route.streamer:
+            body = route.streamer(body)
+
+        if stream:
+            return Response(_stream_with_context(ctx, body), mimetype=route.mimetype)
+
+        resp = Response(body, mimetype=route.mimetype)
+        resp.make_sequence()
+        return resp
+
+    if route.serializer:
+        body = route.serializer(body)
+
+    return Response(body, mimetype=route.mimetype)
+
+def _call_endpoint(endpoint, arguments):
+    body = endpoint(**arguments)
+    if isawaitable(body):
+        body = run_sync(body)
+    return body
+
+_END = object()
+
+def _stream_with_context(ctx, chunks):
+    """ Keep the request context available while a streamed body is sent """
+    context = copy_context()
+    context.run(_request_ctx_var.set, ctx)
+    chunks = iter(chunks)
+    try:
+        while True:
+            # Each chunk is produced inside the request context, whichever
+            # thread the server iterates the response from
+            chunk = context.run(next, chunks, _END)
+            if chunk is _END:
+                return
+            yield chunk
+    except Exception as error:
+        ctx.error = error
+        raise
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            context.run(close)
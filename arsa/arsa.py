@@ -1,17 +1,14 @@
 """ Main module """
-import json
-from werkzeug.routing import Map
-from werkzeug.wrappers import Request, Response
-from werkzeug.exceptions import HTTPException, BadRequest
-from werkzeug.test import run_wsgi_app
-from werkzeug._internal import _log
+import atexit
+import threading
 
+from .accesslog import AccessLogger
+from .metrics import MetricsRegistry
 from .routes import RouteFactory
-from .util import to_serializable
-from .wrappers import AWSEnvironBuilder
-from .exceptions import Redirect
-from .globals import _request_ctx_stack
-from .ctx import RequestContext
+from .app import Application
+from .hooks import Hook
+from .resources import Resource
+from .events import CONSUMERS
 
 class Arsa(object):
     """
@@ -19,20 +16,53 @@ class Arsa(object):
         needed for Arsa.io.
     """
 
-    def __init__(self):
+    def __init__(self, batch_workers=4, compress=False, compress_threshold=1024,
+                 server_timing=False, access_log=True, metrics=None, profiler=None,
+                 tracer=None, memory=None, json_codec=None):
         self.factory = RouteFactory()
-        self.routes = None
         self.middlewares = []
         self.exceptions = []
-
-    def route(self, rule, methods=None, content_type='application/json'):
-        """ Convenience decorator for defining a route """
+        self.consumers = []
+        self.batch_workers = batch_workers
+        self.compress = compress
+        self.compress_threshold = compress_threshold
+        self.server_timing = server_timing
+        self.access_log = AccessLogger() if access_log is True else access_log
+        self.metrics = MetricsRegistry() if metrics is True else metrics
+        self.profiler = profiler
+        self.tracer = tracer
+        self.memory = memory
+        self.json_codec = json_codec
+        self.teardowns = []
+        self.before_hooks = []
+        self.after_hooks = []
+        self.timing_hooks = []
+        self.resources = {}
+        self._app = None
+        self._lock = threading.Lock()
+
+    def route(self, rule, methods=None, content_type='application/json', compress=True, cache=None,
+              etag=None):
+        """
+            Convenience decorator for defining a route. ``cache`` takes a
+            CachePolicy to keep the responses of a GET route. ``etag`` is
+            True to tag responses with a hash of their body, or a callable
+            computing the tag from the endpoint arguments before the
+            endpoint is called.
+        """
         if methods is None:
             methods = ['GET']
 
+        if cache is not None and not set(m.upper() for m in methods).issubset(('GET', 'HEAD')):
+            raise ValueError('Only GET routes can be cached.')
+
         def decorator(func):
             route = self.factory.register_endpoint(func)
             route.set_rule(rule, methods, mimetype=content_type)
+            route.compress = compress
+            route.cache = cache
+            route.etag = etag
+            self._app = None
             return func
 
         return decorator
@@ -41,6 +71,7 @@ class Arsa(object):
         def decorator(func):
             route = self.factory.register_endpoint(func)
             route.add_validation(**expected_kwargs)
+            self._app = None
             return func
 
         return decorator
@@ -49,101 +80,134 @@ class Arsa(object):
         def decorator(func):
             route = self.factory.register_endpoint(func)
             route.add_validation(True, **optional_kwargs)
+            self._app = None
             return func
 
         return decorator
 
-    def handler(self, event, context):
-        app = self.create_app()
+    def sqs(self, queue=None, model=None):
+        """ Decorator for consuming messages of an SQS queue, by name or ARN """
+        return self._consumer('sqs', queue, model=model)
 
-        builder = AWSEnvironBuilder(event, context)
-        builder.close()
-        environ = builder.get_environ()
-        resp = run_wsgi_app(app, environ)
+    def stream(self, name=None, source='kinesis', model=None, ordered=True):
+        """
+            Decorator for consuming a Kinesis stream or DynamoDB table stream,
+            by name or ARN. Ordered streams process each shard's records in turn.
+        """
+        if source not in ('kinesis', 'dynamodb'):
+            raise ValueError('Unknown stream source {}'.format(source))
 
-        #wrap response
-        response = Response(*resp)
+        return self._consumer(source, name, model=model, ordered=ordered)
 
-        # log response
-        print('{host} - - "{method} {path} {protocol}" {status}\n'.format(
-            host=environ.get('SERVER_NAME', 'localhost'),
-            method=environ.get('REQUEST_METHOD', 'GET'),
-            path=environ.get('PATH_INFO', '/'),
-            protocol=environ.get('SERVER_PROTOCOL', '/'),
-            status=response.status_code
-        ))
+    def _consumer(self, source, name, **kwargs):
+        def decorator(func):
+            self.consumers.append(CONSUMERS[source](func, name, **kwargs))
+            self._app = None
+            return func
 
-        return {
-            "statusCode": response.status_code,
-            "headers": dict(response.headers),
-            "body": response.get_data(as_text=True)
-        }
+        return decorator
 
+    def handler(self, event, context):
+        """ Lambda entry point """
+        return self.freeze().handle(event, context)
 
     def add_middleware(self, middleware):
+        """
+            Call ``middleware()`` before every request is routed. A value
+            other than None answers the request without routing it.
+        """
         if callable(middleware):
             self.middlewares.append(middleware)
+            self._app = None
+
+    def resource(self, name, factory, scope='app', shutdown=None, size=4):
+        """
+            Register a client built by ``factory()`` on first use and kept
+            for the lifetime of the container. Endpoints receive it through
+            a parameter called ``name`` or as ``g.<name>``. ``scope`` is
+            'app', 'thread' or 'pool', see `Resource`. ``shutdown(instance)``
+            runs when the resources are closed, at the latest on exit.
+        """
+        if not self.resources:
+            atexit.register(self.close_resources)
+        elif name in self.resources:
+            self.resources[name].close()
+
+        resource = self.resources[name] = Resource(name, factory, scope, shutdown, size)
+        self._app = None
+        return resource
+
+    def close_resources(self):
+        for resource in self.resources.values():
+            resource.close()
+
+    def add_before_hook(self, hook, prefix=None, route=None, unrouted=False):
+        """
+            Call ``hook(rule)`` once a request is routed, for every route or
+            only those under ``prefix`` or matching ``route`` (an endpoint or
+            rule). A value other than None is answered in place of the endpoint.
+            With ``unrouted`` the hook is also called with rule None for paths
+            under its prefix that no route matches, before the 404 or 405 is sent.
+        """
+        if unrouted and route is not None:
+            raise ValueError('Hooks limited to a route cannot run for unrouted paths.')
+
+        if callable(hook):
+            self.before_hooks.append(Hook(hook, prefix, route, unrouted))
+            self._app = None
+
+    def add_after_hook(self, hook, prefix=None, route=None):
+        """
+            Call ``hook(rule, response)`` with the response of a routed
+            request, scoped like before hooks. A returned response replaces
+            it. After hooks run in the reverse order they were added.
+        """
+        if callable(hook):
+            self.after_hooks.append(Hook(hook, prefix, route))
+            self._app = None
+
+    def add_timing_hook(self, hook):
+        """
+            Call ``hook(rule, timer)`` after every request with the matched
+            route (or None) and a PhaseTimer holding the duration of each phase.
+        """
+        if callable(hook):
+            self.timing_hooks.append(hook)
+            self._app = None
+
+    def add_teardown(self, callback):
+        """
+            Call ``callback(error)`` at the end of every request, with the
+            unhandled exception or None, before the request context is removed.
+        """
+        if callable(callback):
+            self.teardowns.append(callback)
+            self._app = None
 
     def add_exception(self, error_type):
         self.exceptions.append(error_type)
-
-    def create_app(self):
-
-        if not self.routes:
-            self.routes = Map(rules=[self.factory]).bind('arsa.io')
-
-        def app(environ, start_response):
-            req = Request(environ)
-            _request_ctx_stack.push(RequestContext(req))
-
-            try:
-
-                # Call middlewares
-                for middleware in self.middlewares:
-                    middleware()
-
-                # Find url rule
-                (rule, arguments) = self.routes.match(req.path, method=req.method, return_rule=True)
-
-                arguments.update(dict(req.args))
-
-                if req.form:
-                    arguments.update(req.form)
-
-                if req.data:
-                    try:
-                        data = json.loads(req.data)
-                        arguments.update(data)
-                    except ValueError:
-                        raise BadRequest("JSON body was malformed")
-
-                rule.has_valid_arguments(arguments)
-                decoded_args = rule.decode_arguments(arguments)
-
-                body = rule.endpoint(**decoded_args)
-
-                if rule.mimetype == 'application/json':
-                    body = json.dumps(body, default=to_serializable)
-
-                resp = Response(body, mimetype=rule.mimetype)
-            except Redirect as error:
-                resp = error
-            except tuple(self.exceptions) as error:
-                code = error.code if hasattr(error, 'code') else 400
-                resp = Response(
-                    response=json.dumps(error, default=to_serializable),
-                    status=code,
-                    mimetype='application/json'
-                )
-            except HTTPException as error:
-                resp = Response(
-                    response=json.dumps(error, default=to_serializable),
-                    status=error.code,
-                    mimetype='application/json'
-                )
-
-            _request_ctx_stack.pop()
-
-            return resp(environ, start_response)
+        self._app = None
+
+    @property
+    def routes(self):
+        """ Bound route map of the frozen application """
+        return self.freeze().routes
+
+    def freeze(self):
+        """
+            Build the application once and reuse it for every following
+            request. Changing the configuration afterwards discards the
+            frozen application so the next request builds a new one.
+        """
+        app = self._app
+        if app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = Application(self)
+                app = self._app
 
         return app
+
+    def create_app(self):
+        """ Create a WSGI application, used by `arsa run` and test clients """
+        return self.freeze()
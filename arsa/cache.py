@@ -0,0 +1,112 @@
+""" Server side response cache """
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from werkzeug.wrappers import Response
+
+class CachePolicy(object):
+    """
+        Caches the responses of a GET route for ``ttl`` seconds, keyed by
+        path, the sorted query arguments and the ``vary`` request headers.
+
+        Up to ``max_entries`` responses are kept in memory, least recently
+        used first out. With ``directory`` (True for the temp directory)
+        responses are also written there, so they outlive the in-memory
+        cache of a refrozen application.
+    """
+
+    def __init__(self, ttl=60, max_entries=1024, vary=None, directory=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.vary = tuple(vary or ())
+        if directory is True:
+            directory = os.path.join(tempfile.gettempdir(), 'arsa-cache')
+        self.directory = directory
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, req):
+        return (
+            req.path,
+            tuple(sorted(req.args.items(multi=True))),
+            tuple(req.headers.get(header) for header in self.vary)
+        )
+
+    def get(self, key):
+        """ A fresh copy of the cached response, or None """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.move_to_end(key)
+                else:
+                    del self.entries[key]
+                    entry = None
+
+        if entry is None and self.directory:
+            entry = self._read(key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None:
+            return None
+
+        _, status, headers, body = entry
+        return Response(body, status=status, headers=headers)
+
+    def set(self, key, resp):
+        """ Store a buffered, successful response """
+        if resp.status_code != 200 or resp.is_streamed:
+            return
+
+        entry = (time.time() + self.ttl, resp.status_code, list(resp.headers.items()), resp.get_data())
+        self._remember(key, entry)
+        if self.directory:
+            self._write(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key, default=str).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as cached:
+                meta = json.loads(cached.readline())
+                body = cached.read()
+        except (OSError, ValueError):
+            return None
+
+        if meta['expires'] <= time.time():
+            return None
+        return meta['expires'], meta['status'], [tuple(header) for header in meta['headers']], body
+
+    def _write(self, key, entry):
+        expires, status, headers, body = entry
+        path = self._path(key)
+        partial = '{}.{}.{}'.format(path, os.getpid(), threading.get_ident())
+        try:
+            with open(partial, 'wb') as cached:
+                meta = {"expires": expires, "status": status, "headers": headers}
+                cached.write(json.dumps(meta).encode('utf-8') + b'\n')
+                cached.write(body)
+            os.replace(partial, path)
+        except OSError:
+            pass
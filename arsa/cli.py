@@ -59,6 +59,18 @@ def _load_custom_handler(python_path, relpath=None):
     mod = __import__(module, globals(), locals(), klass, 0)
     return getattr(mod, klass[0])
 
+def _with_metrics(app):
+    """ Serve the in-memory metrics snapshot of a local app """
+    from werkzeug.wrappers import Response
+
+    def wrapper(environ, start_response):
+        if environ.get('PATH_INFO') == '/_arsa/metrics':
+            resp = Response(json.dumps(app.metrics.snapshot()), mimetype='application/json')
+            return resp(environ, start_response)
+        return app(environ, start_response)
+
+    return wrapper
+
 def _get_config(full_path):
     if not os.path.isfile(full_path):
         raise click.ClickException('Configuration file not found {}'.format(full_path))
@@ -86,11 +98,12 @@ def _entity_not_found(error):
 
 class DeployCommand(object):
 
-    def __init__(self, config, app, region):
+    def __init__(self, config, app, region, api_type=None):
         self.config = _get_config(config)
         self.path = app
         self.stage = self.config['stage']
         self.region = region
+        self.api_type = api_type or self.config.get('api_type', 'rest')
         self.build_id = str(uuid.uuid4())
 
         # Check for credentials
@@ -101,6 +114,7 @@ class DeployCommand(object):
         # Infrastructure Id's
         self.account_id = self.session.client('sts').get_caller_identity().get('Account')
         self.rest_api_id = None
+        self.http_api_id = None
         self.role_arn = None
 
     def deploy(self):
@@ -114,24 +128,35 @@ class DeployCommand(object):
         self._setup_role('{}-execution-role'.format(api_name))
 
         # Create API
-        self._setup_api(api_name)
+        if self.api_type == 'http':
+            self._setup_http_api(api_name)
+            api_id, routes = self.http_api_id, '*'
+        else:
+            self._setup_api(api_name)
+            api_id, routes = self.rest_api_id, '*/*'
 
         # Deploy core lambda handler
         main_handler = self.config['handler']
         self._create_lambda('{}:{}'.format(self.account_id, api_name), main_handler, buf)
-        source_arn = 'arn:aws:execute-api:{region}:{account_id}:{api_id}/{stage}/*/*'.format(
+        source_arn = 'arn:aws:execute-api:{region}:{account_id}:{api_id}/{stage}/{routes}'.format(
             region=self.region,
             account_id=self.account_id,
-            api_id=self.rest_api_id,
-            stage=self.stage
+            api_id=api_id,
+            stage=self.stage,
+            routes=routes
         )
         self._add_lambda_permissions('{}:{}'.format(self.account_id, api_name), source_arn)
 
-        # Setup API proxy resources
-        self._setup_resources()
+        if self.api_type == 'http':
+            # Setup default route and auto deployed stage
+            self._setup_http_routes()
+            self._deploy_http_api(api_name)
+        else:
+            # Setup API proxy resources
+            self._setup_resources()
 
-        # Create new API deployment
-        self._deploy_api(api_name)
+            # Create new API deployment
+            self._deploy_api(api_name)
 
     def _build(self):
         """ build the package """
@@ -258,13 +283,29 @@ class DeployCommand(object):
         except StopIteration:
             click.secho('Creating new api gateway...', fg='yellow')
 
-            # Create Rest API
+            # Create Rest API, binary media types let compressed and binary bodies through
             resp = api_client.create_rest_api(
-                name=api_name
+                name=api_name,
+                binaryMediaTypes=['*/*']
             )
             self.rest_api_id = resp['id']
 
 
+    def _setup_http_api(self, api_name):
+        # Create HTTP API Gateway
+        api_client = self.session.client('apigatewayv2')
+        try:
+            apis = api_client.get_apis()
+            self.http_api_id = next(item['ApiId'] for item in apis['Items'] if item['Name'] == api_name)
+        except StopIteration:
+            click.secho('Creating new http api gateway...', fg='yellow')
+
+            resp = api_client.create_api(
+                Name=api_name,
+                ProtocolType='HTTP'
+            )
+            self.http_api_id = resp['ApiId']
+
     def _setup_role(self, role_name):
          # Create lambda execution role
         iam_client = self.session.client('iam')
@@ -359,6 +400,64 @@ class DeployCommand(object):
             )
 
 
+    def _setup_http_routes(self):
+        api_client = self.session.client('apigatewayv2')
+        routes = api_client.get_routes(ApiId=self.http_api_id)
+        if any(item['RouteKey'] == '$default' for item in routes['Items']):
+            return
+
+        click.secho('Creating new default route...', fg='yellow')
+
+        stage_variable = '${stageVariables.lbfunction}'
+        resp = api_client.create_integration(
+            ApiId=self.http_api_id,
+            IntegrationType='AWS_PROXY',
+            IntegrationMethod='POST',
+            PayloadFormatVersion='2.0',
+            IntegrationUri='arn:aws:lambda:{region}:{account_id}:function:{stage_variable}'.format(
+                region=self.region,
+                account_id=self.account_id,
+                stage_variable=stage_variable)
+        )
+
+        # Route every request to the lambda and assign IAM permissions
+        # NOTE: If custom permissions are needed, this needs to be changed manually.
+        api_client.create_route(
+            ApiId=self.http_api_id,
+            RouteKey='$default',
+            AuthorizationType='AWS_IAM',
+            Target='integrations/{}'.format(resp['IntegrationId'])
+        )
+
+    def _deploy_http_api(self, api_name):
+        click.secho('Creating deployment...', fg='green')
+
+        api_client = self.session.client('apigatewayv2')
+        variables = {
+            'lbfunction': '{}:{}'.format(api_name, self.stage)
+        }
+        stages = api_client.get_stages(ApiId=self.http_api_id)
+        if any(item['StageName'] == self.stage for item in stages['Items']):
+            api_client.update_stage(
+                ApiId=self.http_api_id,
+                StageName=self.stage,
+                StageVariables=variables
+            )
+        else:
+            api_client.create_stage(
+                ApiId=self.http_api_id,
+                StageName=self.stage,
+                AutoDeploy=True,
+                StageVariables=variables
+            )
+
+        click.secho('\nCongratulations your api is deployed at:\n', fg='green')
+        click.secho('https://{api_id}.execute-api.{region}.amazonaws.com/{stage}'.format(
+            api_id=self.http_api_id,
+            region=self.region,
+            stage=self.stage
+        ), fg='blue', bold=True)
+
     def _deploy_api(self, api_name):
         click.secho('Creating deployment...', fg='green')
 
@@ -423,6 +522,8 @@ def run_command(host, port, config, app, handler):
 
     config = _get_config(config)
     _app = _load_app(config['handler'], relpath=app)
+    if _app.metrics:
+        _app = _with_metrics(_app)
 
     run_simple(host, port, _app, request_handler=handler)
 
@@ -430,8 +531,10 @@ def run_command(host, port, config, app, handler):
 @click.option('--config', '-c', default='arsa.json', help='Your arsa config file"')
 @click.option('--app', '-a', default=os.curdir, help='Path to an arsa app if not in root directory.')
 @click.option('--region', default='us-east-1')
-def deploy_command(config, app, region):
-    cmd = DeployCommand(config, app, region)
+@click.option('--api-type', type=click.Choice(['rest', 'http']), default=None,
+              help='Provision a REST API or an HTTP API, defaults to "api_type" in the config.')
+def deploy_command(config, app, region, api_type):
+    cmd = DeployCommand(config, app, region, api_type=api_type)
     cmd.deploy()
 
 def main():
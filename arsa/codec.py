@@ -0,0 +1,71 @@
+""" Pluggable JSON codecs """
+import json
+from functools import partial
+
+from .util import to_serializable
+
+class JSONCodec(object):
+    """
+        Standard library codec and base class of the faster backends.
+        ``dumps`` returns bytes when ``binary`` is set, text otherwise.
+    """
+    name = 'json'
+    binary = False
+
+    def __init__(self):
+        self.dumps = partial(json.dumps, default=to_serializable)
+        self.loads = json.loads
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+    binary = True
+
+    def __init__(self):
+        # pylint: disable=super-init-not-called
+        import orjson
+        self.dumps = partial(orjson.dumps, default=to_serializable, option=orjson.OPT_NON_STR_KEYS)
+        self.loads = orjson.loads
+
+class UjsonCodec(JSONCodec):
+    name = 'ujson'
+
+    def __init__(self):
+        # pylint: disable=super-init-not-called
+        import ujson
+        self.dumps = partial(ujson.dumps, default=to_serializable, escape_forward_slashes=False)
+        self.loads = ujson.loads
+
+class RapidjsonCodec(JSONCodec):
+    name = 'rapidjson'
+
+    def __init__(self):
+        # pylint: disable=super-init-not-called
+        import rapidjson
+        self.dumps = partial(rapidjson.dumps, default=to_serializable)
+        self.loads = rapidjson.loads
+
+CODECS = {codec.name: codec for codec in (OrjsonCodec, UjsonCodec, RapidjsonCodec, JSONCodec)}
+
+# Fastest first, tried in this order by 'auto'
+PREFERRED = ('orjson', 'rapidjson', 'ujson', 'json')
+
+def get_codec(codec=None):
+    """
+        Resolve the ``json_codec`` option: None for the standard library,
+        a backend name, 'auto' for the fastest installed backend or a codec
+        instance. Named backends that are not installed raise ImportError.
+    """
+    if codec is None:
+        return JSONCodec()
+    elif codec == 'auto':
+        for name in PREFERRED:
+            try:
+                return CODECS[name]()
+            except ImportError:
+                continue
+    elif isinstance(codec, str):
+        if codec not in CODECS:
+            raise ValueError('Unknown JSON codec {}'.format(codec))
+        return CODECS[codec]()
+
+    return codec
@@ -0,0 +1,62 @@
+""" Response compression """
+import zlib
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+def _deflate(data):
+    return zlib.compress(data, 6)
+
+def _brotli(data):
+    return brotli.compress(data, quality=4)
+
+# Preferred encodings first, used when the client accepts several equally
+ENCODINGS = [('gzip', _gzip), ('deflate', _deflate)]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', _brotli))
+
+# Content that is already compressed gains nothing from another pass
+INCOMPRESSIBLE = ('image/', 'video/', 'audio/', 'application/zip', 'application/gzip')
+
+class Compressor(object):
+    """ Compresses responses negotiated through the Accept-Encoding header """
+
+    def __init__(self, threshold=1024):
+        self.threshold = threshold
+        self.encoders = dict(ENCODINGS)
+        self.names = [name for name, _ in ENCODINGS]
+
+    def __call__(self, response, accept_encoding):
+        if response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+
+        mimetype = response.mimetype or ''
+        if mimetype.startswith(INCOMPRESSIBLE) and mimetype != 'image/svg+xml':
+            return response
+
+        data = response.get_data()
+        if len(data) < self.threshold:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = parse_accept_header(accept_encoding).best_match(self.names)
+        if encoding:
+            response.set_data(self.encoders[encoding](data))
+            response.headers['Content-Encoding'] = encoding
+
+            # The encoded body is no longer byte for byte the tagged one
+            etag, weak = response.get_etag()
+            if etag is not None and not weak:
+                response.set_etag(etag, weak=True)
+
+        return response
@@ -1,8 +1,22 @@
+from weakref import ref
+
 class _AppCtxGlobals(object):
+    __slots__ = ('__dict__', '_ctx')
+
+    def __init__(self, ctx=None):
+        # Weak, so values stored on g are freed with the request, not by a GC pass
+        self._ctx = ref(ctx) if ctx is not None else None
 
     def get(self, name, default=None):
         return self.__dict__.get(name, default)
 
+    def __getattr__(self, name):
+        # Registered resources are available as attributes of g
+        ctx = self._ctx() if self._ctx is not None else None
+        if ctx is not None and ctx.resources and name in ctx.resources:
+            return ctx.resource(name)
+        raise AttributeError(name)
+
     def __contains__(self, item):
         return item in self.__dict__
 
@@ -11,6 +25,28 @@ class _AppCtxGlobals(object):
 
 class RequestContext(object):
 
-    def __init__(self, request):
+    def __init__(self, request, resources=None):
         self.request = request
-        self.g = _AppCtxGlobals()
+        self.g = _AppCtxGlobals(self)
+        self.rule = None
+        self.span = None
+        self.error = None
+        self.resources = resources
+        self.acquired = None
+
+    def resource(self, name):
+        """ The instance of a resource used by this request, acquired once """
+        if self.acquired is None:
+            self.acquired = {}
+        elif name in self.acquired:
+            return self.acquired[name]
+
+        instance = self.acquired[name] = self.resources[name].acquire()
+        return instance
+
+    def release(self):
+        """ Give pooled resources back once the request is done """
+        if self.acquired:
+            for name, instance in self.acquired.items():
+                self.resources[name].release(instance)
+            self.acquired = None
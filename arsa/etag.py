@@ -0,0 +1,41 @@
+""" Entity tags and conditional GET """
+from hashlib import blake2b
+from werkzeug.http import parse_etags, parse_date
+from werkzeug.wrappers import Response
+
+# Headers a 304 response keeps from the response it replaces
+NOT_MODIFIED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Vary',
+                        'Content-Location', 'Date')
+
+def body_etag(resp):
+    """ Tag a buffered response with a hash of its body """
+    if resp.status_code == 200 and not resp.is_streamed:
+        resp.set_etag(blake2b(resp.get_data(), digest_size=16).hexdigest())
+    return resp
+
+def is_conditional(req):
+    return req.method in ('GET', 'HEAD') and (
+        'If-None-Match' in req.headers or 'If-Modified-Since' in req.headers)
+
+def etag_matches(req, etag):
+    """ Whether If-None-Match lists the tag, by weak comparison """
+    header = req.headers.get('If-None-Match')
+    return bool(header) and parse_etags(header).contains_weak(etag)
+
+def not_modified(req, resp):
+    """ Whether the client already has the response, by ETag or else Last-Modified """
+    if resp.status_code != 200:
+        return False
+
+    if 'If-None-Match' in req.headers:
+        etag = resp.get_etag()[0]
+        return etag is not None and etag_matches(req, etag)
+
+    since = parse_date(req.headers.get('If-Modified-Since'))
+    last_modified = resp.last_modified
+    return since is not None and last_modified is not None and last_modified <= since
+
+def not_modified_response(headers):
+    return Response(status=304, headers=[
+        (key, value) for key, value in headers if key in NOT_MODIFIED_HEADERS
+    ])
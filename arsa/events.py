@@ -0,0 +1,204 @@
+""" Batch event sources """
+import json
+import base64
+from collections import OrderedDict
+from inspect import isawaitable
+from concurrent.futures import ThreadPoolExecutor
+
+from .model import run_plan
+from .util import run_sync
+
+class Consumer(object):
+    """
+        Endpoint for records of an event source. Records are decoded,
+        validated against ``model`` when one is given and passed to the
+        endpoint one at a time.
+    """
+    source = None
+
+    def __init__(self, endpoint, name=None, model=None, ordered=False):
+        self.endpoint = endpoint
+        self.name = name
+        self.model = model
+        self.ordered = ordered
+
+    def matches(self, record):
+        if self.name is None:
+            return True
+
+        arn = record.get('eventSourceARN', '')
+        return self.name == arn or self.name == self.source_name(arn)
+
+    def source_name(self, arn):
+        return arn.rsplit(':', 1)[-1]
+
+    def identifier(self, record):
+        raise NotImplementedError()
+
+    def payload(self, record):
+        raise NotImplementedError()
+
+    def decode(self, record):
+        value = self.payload(record)
+        if self.model is None:
+            return value
+
+        if not isinstance(value, dict):
+            raise ValueError('record {} is not an object'.format(self.identifier(record)))
+
+        run_plan(self.model.__name__, value, self.model._validation)
+        return self.model(**value)
+
+    def __call__(self, record):
+        result = self.endpoint(self.decode(record))
+        if isawaitable(result):
+            result = run_sync(result)
+        return result
+
+class SQSConsumer(Consumer):
+    source = 'aws:sqs'
+
+    def identifier(self, record):
+        return record['messageId']
+
+    def payload(self, record):
+        body = record.get('body')
+        try:
+            return json.loads(body)
+        except (TypeError, ValueError):
+            if self.model is not None:
+                raise
+            return body
+
+class KinesisConsumer(Consumer):
+    source = 'aws:kinesis'
+
+    def source_name(self, arn):
+        return arn.split(':stream/', 1)[-1]
+
+    def identifier(self, record):
+        return record['kinesis']['sequenceNumber']
+
+    def payload(self, record):
+        data = base64.b64decode(record['kinesis']['data'])
+        try:
+            return json.loads(data)
+        except ValueError:
+            if self.model is not None:
+                raise
+            return data
+
+class DynamoDBConsumer(Consumer):
+    source = 'aws:dynamodb'
+
+    def source_name(self, arn):
+        return arn.split(':table/', 1)[-1].split('/', 1)[0]
+
+    def identifier(self, record):
+        return record['dynamodb']['SequenceNumber']
+
+    def payload(self, record):
+        """ New image of the item, or the old image for removals """
+        stream = record['dynamodb']
+        image = stream.get('NewImage', stream.get('OldImage', {}))
+        return {k: _deserialize_dynamodb(v) for k, v in image.items()}
+
+def _dynamodb_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+def _deserialize_dynamodb(value):
+    (kind, raw), = value.items()
+    if kind == 'S' or kind == 'BOOL':
+        return raw
+    elif kind == 'N':
+        return _dynamodb_number(raw)
+    elif kind == 'NULL':
+        return None
+    elif kind == 'B':
+        return base64.b64decode(raw)
+    elif kind == 'M':
+        return {k: _deserialize_dynamodb(v) for k, v in raw.items()}
+    elif kind == 'L':
+        return [_deserialize_dynamodb(v) for v in raw]
+    elif kind == 'SS':
+        return list(raw)
+    elif kind == 'NS':
+        return [_dynamodb_number(v) for v in raw]
+    elif kind == 'BS':
+        return [base64.b64decode(v) for v in raw]
+
+    raise ValueError('Unknown DynamoDB type {}'.format(kind))
+
+CONSUMERS = {
+    'sqs': SQSConsumer,
+    'kinesis': KinesisConsumer,
+    'dynamodb': DynamoDBConsumer
+}
+
+class BatchDispatcher(object):
+    """
+        Processes batch events on a bounded thread pool and reports the
+        records that failed, so only those are retried by Lambda. The event
+        source mapping needs ``ReportBatchItemFailures`` enabled.
+    """
+
+    def __init__(self, consumers, max_workers=4):
+        self.consumers = tuple(consumers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def find_consumer(self, record):
+        source = record.get('eventSource') or record.get('EventSource')
+        for consumer in self.consumers:
+            if consumer.source == source and consumer.matches(record):
+                return consumer
+
+        raise ValueError('No consumer registered for {} records from {}'.format(
+            source, record.get('eventSourceARN')
+        ))
+
+    def handle(self, event):
+        groups = OrderedDict()
+        for record in event['Records']:
+            consumer = self.find_consumer(record)
+            groups.setdefault(self._group_key(consumer, record), (consumer, []))[1].append(record)
+
+        # Ordered groups run one record after another, independent groups in parallel
+        futures = []
+        for key, (consumer, records) in groups.items():
+            if key is None:
+                futures.extend(self.executor.submit(self._process, consumer, [record])
+                               for record in records)
+            else:
+                futures.append(self.executor.submit(self._process, consumer, records))
+
+        failures = [failed for future in futures for failed in future.result()]
+        return {
+            "batchItemFailures": [{"itemIdentifier": failed} for failed in failures]
+        }
+
+    @staticmethod
+    def _group_key(consumer, record):
+        if consumer.source == 'aws:sqs':
+            group = record.get('attributes', {}).get('MessageGroupId')
+            return (record.get('eventSourceARN'), group) if group else None
+        elif consumer.ordered:
+            return record.get('eventSourceARN')
+        return None
+
+    @staticmethod
+    def _process(consumer, records):
+        """
+            Process records in order. After the first failure the remaining
+            records are reported as failed without running, to keep order.
+        """
+        for index, record in enumerate(records):
+            try:
+                consumer(record)
+            except Exception as error: # pylint: disable=broad-except
+                print('Record {} failed: {!r}\n'.format(consumer.identifier(record), error))
+                return [consumer.identifier(rest) for rest in records[index:]]
+
+        return []
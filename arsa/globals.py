@@ -1,5 +1,7 @@
-from werkzeug.local import LocalProxy, LocalStack
-from functools import partial
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from werkzeug.local import LocalProxy
 
 _request_ctx_err_msg = '''\
     Working outside of request context.
@@ -8,14 +10,65 @@ _request_ctx_err_msg = '''\
     information about how to avoid this problem.\
 '''
 
-def _lookup_req_object(name):
-    top = _request_ctx_stack.top
-    if top is None:
+# The active request context. Context variables follow asyncio tasks,
+# and threads started through the helpers below.
+_request_ctx_var = ContextVar('arsa.request_ctx', default=None)
+_pushed_ctx_var = ContextVar('arsa.pushed_ctx', default=())
+
+class _RequestContextStack(object):
+    """ LocalStack compatible view of the request context variable """
+
+    @property
+    def top(self):
+        return _request_ctx_var.get()
+
+    def push(self, ctx):
+        _pushed_ctx_var.set(_pushed_ctx_var.get() + (_request_ctx_var.get(),))
+        _request_ctx_var.set(ctx)
+
+    def pop(self):
+        pushed = _pushed_ctx_var.get()
+        if not pushed:
+            return None
+        ctx = _request_ctx_var.get()
+        _request_ctx_var.set(pushed[-1])
+        _pushed_ctx_var.set(pushed[:-1])
+        return ctx
+
+def current_context():
+    """ The active RequestContext, without going through a proxy """
+    ctx = _request_ctx_var.get()
+    if ctx is None:
         raise RuntimeError(_request_ctx_err_msg)
-    return getattr(top, name)
+    return ctx
+
+def current_request():
+    return current_context().request
+
+def current_g():
+    return current_context().g
+
+def _lookup_req_object(name):
+    return getattr(current_context(), name)
+
+def copy_current_request_context(func):
+    """ Wrap ``func`` to run in the current context, for example in another thread """
+    context = copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return wrapper
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ Thread pool running each task in the context it was submitted from """
+
+    def submit(self, fn, *args, **kwargs):
+        return super(ContextThreadPoolExecutor, self).submit(copy_context().run, fn, *args, **kwargs)
 
 # context locals
-_request_ctx_stack = LocalStack()
+_request_ctx_stack = _RequestContextStack()
 
 request = LocalProxy(partial(_lookup_req_object, 'request'))
 g = LocalProxy(partial(_lookup_req_object, 'g'))
@@ -0,0 +1,31 @@
+""" Before and after request hooks """
+
+class Hook(object):
+    """
+        A request hook, limited to the rules under ``prefix`` or to one
+        ``route``. Only ``unrouted`` hooks run for paths no rule matches.
+    """
+
+    def __init__(self, func, prefix=None, route=None, unrouted=False):
+        self.func = func
+        self.prefix = prefix
+        self.route = route
+        self.unrouted = unrouted
+
+    def matches(self, path):
+        """ Whether the path is the prefix or below it, on a segment boundary """
+        if self.prefix is None:
+            return True
+        prefix = self.prefix.rstrip('/')
+        return path == prefix or path.startswith(prefix + '/')
+
+    def applies(self, rule):
+        if not self.matches(rule.rule):
+            return False
+        if self.route is not None and self.route is not rule.endpoint and self.route != rule.rule:
+            return False
+        return True
+
+def compile_hooks(hooks, rule):
+    """ The hook functions that run for a rule, in the order they are called """
+    return tuple(hook.func for hook in hooks if hook.applies(rule))
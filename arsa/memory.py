@@ -0,0 +1,65 @@
+""" Per request memory accounting """
+import gc
+import sys
+import json
+import threading
+import tracemalloc
+
+class MemoryAccountant(object):
+    """
+        Opt-in tracemalloc accounting. Records the peak allocation of every
+        request per route and the memory still allocated once its context
+        is torn down. Requests that leave more than ``threshold`` bytes
+        behind, even after a garbage collection, are passed to ``report``.
+
+        tracemalloc is process wide, so figures are only exact when requests
+        do not overlap, as in Lambda.
+    """
+
+    def __init__(self, threshold=1024 * 1024, report=None, frames=1):
+        self.threshold = threshold
+        self.report = report or _print_report
+        self.frames = frames
+        self.routes = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self._local.start = tracemalloc.get_traced_memory()[0]
+
+    def end(self, rule):
+        start = self._local.start
+        current, peak = tracemalloc.get_traced_memory()
+        retained = current - start
+        if retained > self.threshold:
+            # Only pay for a collection when something looks retained
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - start
+
+        route = rule.rule if rule else None
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = {"requests": 0, "peak": 0, "retained": 0}
+            stats['requests'] += 1
+            stats['peak'] = max(stats['peak'], peak - start)
+            stats['retained'] += retained
+
+        if retained > self.threshold:
+            self.report({
+                "route": route,
+                "peak": peak - start,
+                "retained": retained,
+                "total": tracemalloc.get_traced_memory()[0]
+            })
+
+    def snapshot(self):
+        """ Peak allocation and total retained bytes per route """
+        with self._lock:
+            return {route: dict(stats) for route, stats in self.routes.items()}
+
+def _print_report(report):
+    sys.stdout.write(json.dumps({"memory": report}, separators=(',', ':')) + '\n')
@@ -0,0 +1,175 @@
+""" Per route latency metrics """
+import sys
+import json
+import time
+import threading
+from bisect import bisect_left
+
+def _bucket_bounds(lowest=0.05, highest=60000.0, growth=1.25):
+    bounds = [lowest]
+    while bounds[-1] < highest:
+        bounds.append(bounds[-1] * growth)
+    return bounds
+
+class Histogram(object):
+    """
+        Latency histogram in milliseconds with fixed, logarithmically
+        spaced buckets. Memory stays constant and every reported value is
+        within the bucket growth factor (25%) of the recorded one.
+    """
+    BOUNDS = _bucket_bounds()
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @classmethod
+    def bucket_value(cls, index):
+        """ Representative value of a bucket, the midpoint of its bounds """
+        if index == 0:
+            return cls.BOUNDS[0]
+        elif index == len(cls.BOUNDS):
+            return cls.BOUNDS[-1]
+        return (cls.BOUNDS[index - 1] + cls.BOUNDS[index]) / 2
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bucket_value(index), self.max)
+
+        return self.max
+
+class RouteMetrics(object):
+    """ Latency histogram and status counters of one route and method """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = {}
+        self._emitted = list(self.latency.counts)
+        self._emitted_statuses = {}
+
+    def record(self, status, duration):
+        self.latency.record(duration)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def delta(self):
+        """ Bucket and status counts recorded since the previous call """
+        counts = self.latency.counts
+        buckets = [(index, count - self._emitted[index])
+                   for index, count in enumerate(counts) if count != self._emitted[index]]
+        statuses = {status: count - self._emitted_statuses.get(status, 0)
+                    for status, count in self.statuses.items()}
+
+        self._emitted = list(counts)
+        self._emitted_statuses = dict(self.statuses)
+        return buckets, statuses
+
+class MetricsRegistry(object):
+    """
+        Keeps latency histograms and status counters per route and method.
+
+        Recorded requests are written as CloudWatch Embedded Metric Format
+        documents, one per route, at the end of every invocation or every
+        ``flush_every`` requests. ``snapshot`` returns the totals so far.
+    """
+
+    def __init__(self, namespace='Arsa', flush_every=None, stream=None):
+        self.namespace = namespace
+        self.flush_every = flush_every
+        self.stream = stream
+        self.routes = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def record(self, rule, method, status, duration):
+        key = (rule.rule if rule else None, method)
+        with self._lock:
+            metrics = self.routes.get(key)
+            if metrics is None:
+                metrics = self.routes[key] = RouteMetrics()
+            metrics.record(status, duration)
+            self._pending += 1
+
+    def end_invocation(self):
+        if self.flush_every is None or self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        documents = self.documents()
+        if documents:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(json.dumps(doc, separators=(',', ':')) + '\n' for doc in documents))
+            stream.flush()
+
+    def documents(self):
+        """ EMF documents for everything recorded since the last flush """
+        timestamp = int(time.time() * 1000)
+        documents = []
+
+        with self._lock:
+            if not self._pending:
+                return documents
+            self._pending = 0
+
+            for (route, method), metrics in self.routes.items():
+                buckets, statuses = metrics.delta()
+                if not buckets:
+                    continue
+
+                documents.append({
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [{
+                            "Namespace": self.namespace,
+                            "Dimensions": [["Route", "Method"]],
+                            "Metrics": [
+                                {"Name": "Latency", "Unit": "Milliseconds"},
+                                {"Name": "Requests", "Unit": "Count"},
+                                {"Name": "4xx", "Unit": "Count"},
+                                {"Name": "5xx", "Unit": "Count"}
+                            ]
+                        }]
+                    },
+                    "Route": route or 'unmatched',
+                    "Method": method,
+                    "Latency": {
+                        "Values": [round(Histogram.bucket_value(index), 3) for index, _ in buckets],
+                        "Counts": [count for _, count in buckets]
+                    },
+                    "Requests": sum(statuses.values()),
+                    "4xx": sum(count for status, count in statuses.items() if 400 <= status < 500),
+                    "5xx": sum(count for status, count in statuses.items() if status >= 500)
+                })
+
+        return documents
+
+    def snapshot(self):
+        """ Totals per route since the registry was created """
+        with self._lock:
+            return {
+                '{} {}'.format(method, route or 'unmatched'): {
+                    "count": metrics.latency.count,
+                    "mean": metrics.latency.total / metrics.latency.count,
+                    "p50": metrics.latency.percentile(50),
+                    "p90": metrics.latency.percentile(90),
+                    "p99": metrics.latency.percentile(99),
+                    "max": metrics.latency.max,
+                    "statuses": dict(metrics.statuses)
+                }
+                for (route, method), metrics in self.routes.items()
+            }
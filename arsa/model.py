@@ -1,11 +1,27 @@
 """ model.py """
 from six import add_metaclass
+from array import array
 from inspect import getmembers
+from operator import attrgetter
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from .exceptions import ArgumentKeyError
 
 class ListType(list):
+    """
+        Typed list for route conditions. ``_array`` is passed on to
+        the ListAttribute to receive the list as an array.
+    """
     _type = object
+    _array = None
+
+# NumPy dtype kinds accepted for each primitive list type
+NUMPY_KINDS = {bool: 'b', int: 'iub', float: 'f', str: 'U'}
 
 class Attribute(object):
 
@@ -22,18 +38,45 @@ class Attribute(object):
 
 class ListAttribute(Attribute):
 
-    def __init__(self, optional=False, typeof=None, attr_name=None):
+    """
+        List of ``typeof`` items. Primitive lists can be converted once
+        validated: ``array`` is an array module typecode such as 'q' or
+        'd', or 'numpy' for an ndarray.
+    """
+
+    def __init__(self, optional=False, typeof=None, attr_name=None, array=None):
         super(ListAttribute, self).__init__(list, optional=optional, attr_name=attr_name)
 
         if not typeof:
             raise ValueError("List attribute must have a typeof.")
 
+        if array == 'numpy':
+            if numpy is None:
+                raise ImportError("NumPy is required for numpy list attributes.")
+            if typeof not in NUMPY_KINDS:
+                raise ValueError("NumPy lists must be of bool, int, float or str.")
+
         self.typeof = typeof
+        self.array = array
 
 class ModelMeta(type):
+    def __new__(mcs, name, bases, attrs):
+        compact = attrs.get('__compact__', any(getattr(base, '__compact__', False) for base in bases))
+        if compact:
+            attrs = ModelMeta._compact_namespace(bases, dict(attrs))
+        return super(ModelMeta, mcs).__new__(mcs, name, bases, attrs)
+
     def __init__(cls, name, bases, attrs):
         super(ModelMeta, cls).__init__(name, bases, attrs)
-        ModelMeta._initialize_attributes(cls)
+        compact = getattr(cls, '__compact__', False)
+        if not compact:
+            ModelMeta._initialize_attributes(cls)
+        else:
+            # Slot descriptors, read directly to tell unset slots from None
+            cls._compact_members = tuple(getattr(cls, name) for name in cls._compact_slots)
+        cls._encoder = staticmethod(_compile_encoder(cls._attributes, compact))
+        cls._validation = compile_plan(cls._attributes)
+        cls._decoders = _compile_decoders(cls._attributes)
 
     @staticmethod
     def _initialize_attributes(cls):
@@ -42,19 +85,290 @@ class ModelMeta(type):
             attribute.attr_name = name
             cls._attributes[name] = attribute
 
+    @staticmethod
+    def _compact_namespace(bases, attrs):
+        """
+            Store the values of a compact Model in slots. The Attribute
+            descriptors make way for the slots, inherited ones included.
+        """
+        attributes, slotted = {}, set()
+        for base in reversed(bases):
+            attributes.update(getattr(base, '_attributes', {}))
+            slotted.update(getattr(base, '_compact_slots', ()))
+
+        for key, value in list(attrs.items()):
+            if isinstance(value, Attribute):
+                value.attr_name = key
+                attributes[key] = attrs.pop(key)
+
+        names = tuple(attributes)
+        attrs['__compact__'] = True
+        attrs['__slots__'] = tuple(key for key in names if key not in slotted)
+        attrs['_compact_slots'] = names
+        attrs['_attributes'] = attributes
+        attrs['_values'] = _values_getter(names)
+        attrs['attribute_values'] = property(_compact_values)
+        attrs['_clear'] = _compact_clear
+        attrs['__getattr__'] = _compact_getattr
+        return attrs
+
+def _values_getter(names):
+    if len(names) == 1:
+        name = names[0]
+        return staticmethod(lambda model: (getattr(model, name),))
+    elif not names:
+        return staticmethod(lambda model: ())
+    return staticmethod(attrgetter(*names))
+
+def _compact_values(model):
+    """ Set attribute values of a compact Model, explicit None included """
+    values = {}
+    for name, value, member in zip(model._compact_slots, model._values(model), model._compact_members):
+        if value is None:
+            try:
+                member.__get__(model)
+            except AttributeError:
+                continue
+        values[name] = value
+    return values
+
+def _compact_clear(_):
+    """ The slots of a new compact Model start out unset """
+
+def _compact_getattr(model, name):
+    # Only reached for unset slots and unknown names
+    if name in model._attributes:
+        return None
+    raise AttributeError(name)
+
+def _encode_model(value):
+    return value._encoder(value) if isinstance(value, Model) else value
+
+def _encode_models(values):
+    return [item._encoder(item) if isinstance(item, Model) else item for item in values]
+
+def _encode_flat(model):
+    return model.attribute_values
+
+def _compile_encoder(attributes, compact=False):
+    """
+        Build the encoder of a Model class. Only attributes holding Models
+        need converting, a class without any returns its values as they are.
+        Compact Models build a fresh dict that can be converted in place.
+    """
+    nested = []
+    for name, attr in attributes.items():
+        if isinstance(attr, ListAttribute):
+            if isinstance(attr.typeof, ModelMeta):
+                nested.append((name, _encode_models))
+        elif isinstance(attr.attr_type, ModelMeta):
+            nested.append((name, _encode_model))
+
+    if not nested:
+        return _encode_flat
+
+    nested = tuple(nested)
+
+    def encode(model):
+        values = model.attribute_values
+        result = values if compact else dict(values)
+        for name, convert in nested:
+            value = values.get(name)
+            if value is not None:
+                result[name] = convert(value)
+        return result
+
+    return encode
+
+class _Invalid(Exception):
+    """ Raised by compiled checks, the failing path is collected while unwinding """
+
+    def __init__(self, attr_type=None, key=None):
+        super(_Invalid, self).__init__()
+        self.attr_type = attr_type
+        self.path = [] if key is None else [key]
+
+    def describe(self, name):
+        path = '.'.join(str(key) for key in [name] + self.path[::-1])
+        if self.attr_type is None:
+            return "argument {} was not detected.".format(path)
+        return "argument {} was not of the type {}".format(path, self.attr_type)
+
+def _type_check(attr_type):
+    def check(value):
+        if not isinstance(value, attr_type) and not (isinstance(value, list) and len(value) == 1):
+            raise _Invalid(attr_type)
+    return check
+
+def _list_check(item_check):
+    def check(value):
+        index = 0
+        try:
+            for index, item in enumerate(value):
+                item_check(item)
+        except _Invalid as invalid:
+            invalid.path.append(index)
+            raise
+    return check
+
+def _primitive_list_check(typeof, item_check):
+    slow_check = _list_check(item_check)
+
+    def check(value):
+        # One pass in C, the slow check only runs to locate a failure
+        if not all(map(isinstance, value, repeat(typeof))):
+            slow_check(value)
+    return check
+
+def _model_check(plan):
+    def check(value):
+        _run_plan(plan, value)
+    return check
+
+def _compile_check(attribute):
+    attr_type = attribute.attr_type
+    if isinstance(attr_type, ModelMeta):
+        return _model_check(attr_type._validation)
+    elif isinstance(attribute, ListAttribute):
+        item_check = _compile_check(Attribute(attribute.typeof))
+        if isinstance(attribute.typeof, ModelMeta):
+            return _list_check(item_check)
+        return _primitive_list_check(attribute.typeof, item_check)
+    return _type_check(attr_type)
+
+def _to_array(attribute):
+    if attribute.array == 'numpy':
+        return numpy.asarray
+    typecode = attribute.array
+    return lambda values: array(typecode, values)
+
+def _array_decode(attribute):
+    """ Convert a validated primitive list, failures raise _Invalid """
+    typeof = attribute.typeof
+    convert = _to_array(attribute)
+    kinds = NUMPY_KINDS[typeof] if attribute.array == 'numpy' else None
+
+    def decode(value):
+        try:
+            converted = convert(value)
+        except (TypeError, ValueError, OverflowError):
+            raise _Invalid(typeof)
+        if kinds is not None:
+            if not len(converted):
+                return converted.astype(typeof)
+            if converted.dtype.kind not in kinds:
+                # For example integers beyond int64, kept as objects
+                raise _Invalid(typeof)
+        return converted
+    return decode
+
+def _decode_model(model):
+    return lambda value: value if isinstance(value, Model) else model(**value)
+
+def _decode_models(model):
+    return lambda values: [item if isinstance(item, Model) else model(**item) for item in values]
+
+def _compile_decoders(attributes):
+    """ Converters turning nested dicts into Models when a Model is built """
+    decoders = {}
+    for name, attr in attributes.items():
+        if isinstance(attr, ListAttribute):
+            if isinstance(attr.typeof, ModelMeta):
+                decoders[name] = _decode_models(attr.typeof)
+            elif attr.array:
+                decoders[name] = _to_array(attr)
+        elif isinstance(attr.attr_type, ModelMeta):
+            decoders[name] = _decode_model(attr.attr_type)
+    return decoders
+
+def _unwrap(value):
+    return value[0] if isinstance(value, list) and len(value) == 1 else value
+
+def _compile_decode(attribute):
+    if isinstance(attribute.attr_type, ModelMeta):
+        model = attribute.attr_type
+        return lambda value: model(**value)
+    elif isinstance(attribute, ListAttribute):
+        return None
+    return _unwrap
+
+def compile_plan(attributes, decode=False):
+    """
+        Flatten a dict of attributes into (key, optional, check, decode)
+        entries, run in one pass by `run_plan`. With ``decode`` valid
+        arguments are also replaced by their Model, single value or array.
+    """
+    plan = []
+    for key, attr in attributes.items():
+        check = _compile_check(attr)
+        if not decode:
+            plan.append((key, attr.optional, check, None))
+        elif getattr(attr, 'array', None):
+            plan.append((key, attr.optional, check, _array_decode(attr)))
+        else:
+            plan.append((key, attr.optional, check, _compile_decode(attr)))
+    return tuple(plan)
+
+def _run_plan(plan, arguments):
+    for key, optional, check, decode in plan:
+        if key in arguments:
+            value = arguments[key]
+            try:
+                check(value)
+                if decode is not None:
+                    arguments[key] = decode(value)
+            except _Invalid as invalid:
+                invalid.path.append(key)
+                raise
+        elif not optional:
+            raise _Invalid(key=key)
+
+    return arguments
+
+def run_plan(name, arguments, plan):
+    """ Validate arguments against a compiled plan, raising ArgumentKeyError """
+    try:
+        return _run_plan(plan, arguments)
+    except _Invalid as invalid:
+        raise ArgumentKeyError(invalid.describe(name))
+
 @add_metaclass(ModelMeta)
 class Model(object):
     """ Abstract class to wrap custom object attributes """
+    # Subclasses get a __dict__ unless they are compact
+    __slots__ = ()
 
     def __init__(self, **attributes):
+        self._clear()
+        self._assign(attributes)
+
+    @classmethod
+    def from_many(cls, items):
+        """ Build a list of Models from a list of attribute dicts """
+        if cls.__init__ is not Model.__init__:
+            return [cls(**item) for item in items]
+
+        new, clear, assign = object.__new__, cls._clear, cls._assign
+        models = []
+        for item in items:
+            model = new(cls)
+            clear(model)
+            assign(model, item)
+            models.append(model)
+        return models
+
+    def _clear(self):
         self.attribute_values = {}
-        self._set_attributes(**attributes)
 
     @property
     def attributes(self):
         """ Get defined attribute values """
         return self.attribute_values
 
+    def serialize(self):
+        """ Attribute values as plain dicts and lists, nested Models included """
+        return self._encoder(self)
+
     def __iter__(self):
         return iter(self.attribute_values)
 
@@ -65,47 +379,35 @@ class Model(object):
         """
         Sets the attributes for this object
         """
+        self._assign(attributes)
+
+    def _assign(self, attributes):
+        known, decoders = self._attributes, self._decoders
         for attr_name, attr_value in attributes.items():
-            if attr_name not in self._get_attributes():
+            if attr_name not in known:
                 raise ValueError("Attribute {0} specified does not exist".format(attr_name))
 
-            attr = self._get_attributes().get(attr_name)
-            if isinstance(attr.attr_type, ModelMeta):
-                setattr(self, attr_name, attr.attr_type(**attr_value))
-            elif isinstance(attr, ListAttribute):
-                attrs = [attr.typeof(**a) if not isinstance(a, Model) else a for a in attr_value]
-                setattr(self, attr_name, attrs)
-            else:
-                setattr(self, attr_name, attr_value)
+            decode = decoders.get(attr_name)
+            if decode is not None and attr_value is not None:
+                attr_value = decode(attr_value)
+            setattr(self, attr_name, attr_value)
 
     @classmethod
     def _get_attributes(cls):
         """ Return a dict of the models attributes """
         return cls._attributes
 
-def valid_arguments(name, arguments, attributes):
-
-    def valid_argument(name, argument, attribute):
-        if isinstance(attribute.attr_type, ModelMeta):
-            valid_arguments(name, argument, attribute.attr_type._get_attributes())
-        elif issubclass(attribute.attr_type, list):
-            for index, item in enumerate(argument):
-                valid_argument('{}.{}'.format(name, index), item, Attribute(attribute.typeof))
-        elif not isinstance(argument, attribute.attr_type):
-            if isinstance(argument, list) and len(argument) == 1:
-                pass
-            else:
-                raise ArgumentKeyError("argument {} was not of the type {}".format(name, attribute.attr_type))
-        return True
-
-    for key, attr in attributes.items():
-        next_name = "{}.{}".format(name, key)
-        if attr.optional:
-            if key in arguments:
-                valid_argument(next_name, arguments[key], attr)
-        elif not attr.optional and key not in arguments:
-            raise ArgumentKeyError("argument {} was not detected.".format(next_name))
-        else:
-            valid_argument(next_name, arguments[key], attr)
+def encode_body(body):
+    """
+        Plain values for a Model or a list of Models, encoded directly so
+        codecs do not call their default hook once per Model.
+    """
+    if isinstance(body, Model):
+        return body._encoder(body)
+    elif isinstance(body, list) and body and isinstance(body[0], Model):
+        return _encode_models(body)
+    return body
 
+def valid_arguments(name, arguments, attributes):
+    run_plan(name, arguments, compile_plan(attributes))
     return True
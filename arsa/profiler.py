@@ -0,0 +1,89 @@
+""" Slow request profiling """
+import io
+import os
+import json
+import time
+import random
+import pstats
+import itertools
+import cProfile
+import tempfile
+
+def _shape(value):
+    """ Describe an argument by type and size without keeping its content """
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    elif isinstance(value, (list, tuple, set)):
+        return '{}[{}]'.format(type(value).__name__, len(value))
+    return type(value).__name__
+
+class FileSink(object):
+    """ Writes the profile and a JSON summary of each slow request to a directory """
+
+    def __init__(self, directory=None):
+        self.directory = directory or tempfile.gettempdir()
+        self._sequence = itertools.count()
+
+    def __call__(self, report, profile):
+        # The sequence number keeps concurrent requests of one process apart
+        name = 'arsa-profile-{}-{}-{}'.format(int(report['time'] * 1000), os.getpid(), next(self._sequence))
+        path = os.path.join(self.directory, name)
+
+        profile.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as summary:
+            json.dump(report, summary, indent=2)
+
+        return path
+
+class SlowRequestProfiler(object):
+    """
+        Profiles a sampled fraction of endpoint calls with cProfile and hands
+        the result to ``sink`` when the call took at least ``threshold``
+        milliseconds. Unsampled requests only pay for one random draw.
+    """
+
+    def __init__(self, threshold=500, sample_rate=0.01, sink=None, limit=30):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.sink = sink or FileSink()
+        self.limit = limit
+
+    def __call__(self, rule, arguments, call):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return call(rule.endpoint, arguments)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this interpreter
+            return call(rule.endpoint, arguments)
+
+        start = time.perf_counter()
+        try:
+            return call(rule.endpoint, arguments)
+        finally:
+            profile.disable()
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= self.threshold:
+                self._emit(rule, arguments, duration, profile)
+
+    def _emit(self, rule, arguments, duration, profile):
+        """ Hand a slow call to the sink. Sink errors are reported, never raised into a request """
+        try:
+            self.sink(self._report(rule, arguments, duration, profile), profile)
+        except Exception as error: # pylint: disable=broad-except
+            print('Profile sink {!r} failed: {!r}\n'.format(self.sink, error))
+
+    def _report(self, rule, arguments, duration, profile):
+        stats = io.StringIO()
+        pstats.Stats(profile, stream=stats).sort_stats('cumulative').print_stats(self.limit)
+
+        return {
+            "time": time.time(),
+            "route": rule.rule,
+            "endpoint": getattr(rule.endpoint, '__name__', repr(rule.endpoint)),
+            "duration": round(duration, 3),
+            "arguments": _shape(arguments),
+            "stats": stats.getvalue()
+        }
@@ -0,0 +1,80 @@
+""" Reusable clients shared by requests """
+import queue
+import threading
+
+SCOPES = ('app', 'thread', 'pool')
+
+class Resource(object):
+    """
+        A client built lazily by ``factory()`` and reused across requests
+        and warm invocations. ``scope`` is 'app' for one shared instance,
+        'thread' for one per thread or 'pool' for up to ``size`` instances
+        lent to one request at a time. ``shutdown(instance)`` is called for
+        every instance when the resource is closed.
+    """
+
+    def __init__(self, name, factory, scope='app', shutdown=None, size=4):
+        if scope not in SCOPES:
+            raise ValueError('Unknown resource scope {}'.format(scope))
+
+        self.name = name
+        self.factory = factory
+        self.scope = scope
+        self.shutdown = shutdown
+        self.size = size
+        self._instances = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = queue.LifoQueue()
+
+    def acquire(self):
+        if self.scope == 'app':
+            instances = self._instances
+            if instances:
+                return instances[0]
+            with self._lock:
+                if not self._instances:
+                    self._instances.append(self.factory())
+                return self._instances[0]
+
+        elif self.scope == 'thread':
+            instance = getattr(self._local, 'instance', None)
+            if instance is None:
+                instance = self._local.instance = self._create()
+            return instance
+
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._instances) < self.size:
+                instance = self.factory()
+                self._instances.append(instance)
+                return instance
+        # Every instance is lent out, wait for one to come back
+        return self._pool.get()
+
+    def release(self, instance):
+        if self.scope == 'pool':
+            self._pool.put(instance)
+
+    def close(self):
+        """ Forget every instance, calling the shutdown hook on each """
+        with self._lock:
+            instances, self._instances = self._instances, []
+            self._local = threading.local()
+            self._pool = queue.LifoQueue()
+
+        if self.shutdown:
+            for instance in instances:
+                try:
+                    self.shutdown(instance)
+                except Exception as shutdown_error: # pylint: disable=broad-except
+                    print('Shutdown of resource {} failed: {!r}\n'.format(self.name, shutdown_error))
+
+    def _create(self):
+        instance = self.factory()
+        with self._lock:
+            self._instances.append(instance)
+        return instance
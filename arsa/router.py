@@ -0,0 +1,158 @@
+""" Indexed route matching """
+import re
+from functools import lru_cache
+from werkzeug.routing import (UnicodeConverter, IntegerConverter, FloatConverter,
+                              UUIDConverter, ValidationError)
+
+MATCH_CACHE_SIZE = 1024
+
+# Converters whose pattern always stays within one path segment
+SEGMENT_CONVERTERS = (UnicodeConverter, IntegerConverter, FloatConverter, UUIDConverter)
+
+_VARIABLE = re.compile(r'^<(?:[a-zA-Z_][a-zA-Z0-9_]*(?:\(.*\))?:)?([a-zA-Z_][a-zA-Z0-9_]*)>$')
+
+def _segments(rule):
+    """
+        Split a rule into literal strings and (name, pattern, converter)
+        variables, one per path segment. None when werkzeug has to match it.
+    """
+    if rule.defaults or rule.redirect_to is not None or rule.build_only or rule.alias:
+        return None
+    if rule.host is not None or rule.subdomain or not rule.rule.startswith('/'):
+        return None
+
+    segments = []
+    for part in rule.rule[1:].split('/'):
+        if '<' not in part and '>' not in part:
+            segments.append(part)
+            continue
+
+        match = _VARIABLE.match(part)
+        if match is None:
+            return None
+        converter = rule._converters.get(match.group(1))
+        if type(converter) not in SEGMENT_CONVERTERS:
+            return None
+        segments.append((match.group(1), re.compile(converter.regex), converter))
+
+    return tuple(segments)
+
+class _Node(object):
+    __slots__ = ('literals', 'variables', 'rules')
+
+    def __init__(self):
+        self.literals = {}
+        self.variables = []
+        self.rules = []
+
+    def insert(self, segments, rank, rule):
+        node = self
+        for segment in segments:
+            if isinstance(segment, str):
+                node = node.literals.setdefault(segment, _Node())
+            else:
+                name, pattern, converter = segment
+                for variable, child in node.variables:
+                    if variable[1].pattern == pattern.pattern and type(variable[2]) is type(converter):
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.variables.append((segment, child))
+                    node = child
+        node.rules.append((rank, rule))
+
+    def search(self, parts, index, values, found, convert):
+        """ Collect (rank, rule, values) of every rule matching the parts """
+        if index == len(parts):
+            for rank, rule in self.rules:
+                found.append((rank, rule, values))
+            return
+
+        part = parts[index]
+        child = self.literals.get(part)
+        if child is not None:
+            child.search(parts, index + 1, values, found, convert)
+
+        for (name, pattern, converter), child in self.variables:
+            if pattern.fullmatch(part) is None:
+                continue
+            if convert:
+                try:
+                    value = converter.to_python(part)
+                except ValidationError:
+                    continue
+            else:
+                value = part
+            child.search(parts, index + 1, values + ((name, value),), found, convert)
+
+class Router(object):
+    """
+        Matches paths without trying every rule in turn. Static paths are
+        looked up in a dict, parameterized ones in a segment trie per
+        method, and successful matches are kept in an LRU cache.
+
+        Results are those of the werkzeug adapter, which still handles
+        misses (404, 405 and trailing slash redirects) and, when any rule
+        uses converters spanning segments or other rule options, every
+        request.
+    """
+
+    def __init__(self, adapter, cache_size=MATCH_CACHE_SIZE):
+        self.adapter = adapter
+        self.static = {}
+        self.tries = {}
+        self.native = True
+        self.slashes = False
+
+        for rank, rule in enumerate(adapter.map.iter_rules()):
+            segments = _segments(rule)
+            if segments is None:
+                self.native = False
+                break
+
+            if rule.rule.endswith('/'):
+                self.slashes = True
+
+            methods = rule.methods if rule.methods is not None else (None,)
+            for method in methods:
+                if not rule.arguments:
+                    self.static.setdefault((method, rule.rule), []).append((rank, rule))
+                else:
+                    self.tries.setdefault(method, _Node()).insert(segments, rank, rule)
+
+        if cache_size:
+            self._match = lru_cache(maxsize=cache_size)(self._match)
+
+    def match(self, path, method):
+        """ Return the matching rule and its converted URL arguments """
+        rule, values = self._match(path, method)
+        return rule, dict(values)
+
+    def _match(self, path, method):
+        if self.native and path:
+            best = self._search(path, method, True)
+            if best is not None and not self._redirects(path, method, best[0]):
+                return best[1], best[2]
+
+        rule, arguments = self.adapter.match(path, method=method, return_rule=True)
+        return rule, tuple(arguments.items())
+
+    def _search(self, path, method, convert):
+        """ The best ranked (rank, rule, values) allowing the method """
+        path = '/' + path.lstrip('/')
+        found = []
+        for key in (method, None):
+            found.extend((rank, rule, ()) for rank, rule in self.static.get((key, path), ()))
+            trie = self.tries.get(key)
+            if trie is not None:
+                trie.search(path[1:].split('/'), 0, (), found, convert)
+
+        return min(found, key=lambda item: item[0]) if found else None
+
+    def _redirects(self, path, method, rank):
+        """ Whether werkzeug would first redirect to the path with a trailing slash """
+        if not self.slashes or path.endswith('/'):
+            return False
+        redirect = self._search(path + '/', method, False)
+        return redirect is not None and redirect[0] < rank
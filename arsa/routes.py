@@ -1,17 +1,29 @@
-from collections import namedtuple
+import inspect
+from functools import partial
 from werkzeug.routing import (Rule, RuleFactory)
 from werkzeug.exceptions import BadRequest
 
 
-from .model import valid_arguments, Attribute, Model, ListType, ListAttribute
+from .model import compile_plan, run_plan, encode_body, Attribute, ListType, ListAttribute
 from .exceptions import ArgumentKeyError
+from .util import iter_json, iter_ndjson
+from .codec import JSONCodec
 
 class Route(Rule):
 
     def __init__(self, endpoint, **kwargs):
         super(Route, self).__init__('/_arsa', endpoint=endpoint, **kwargs)
         self._conditions = {}
+        self._plan = ()
+        self._list_keys = frozenset()
         self.mimetype = None
+        self.compress = True
+        self.cache = None
+        self.etag = None
+
+    def bind(self, map, rebind=False):
+        # Routes are rebound whenever a new application is frozen
+        super(Route, self).bind(map, rebind=True)
 
     def set_rule(self, rule, methods=None, mimetype=None):
         self.rule = rule
@@ -28,30 +40,125 @@ class Route(Rule):
         if 'query' in conditions:
             raise ValueError('The query named parameter is reserved.')
 
-        conditions = {k: ListAttribute(typeof=v._type, optional=optional)
+        conditions = {k: ListAttribute(typeof=v._type, optional=optional, array=v._array)
                          if issubclass(v, ListType) else Attribute(v, optional=optional)
                       for k, v in conditions.items()}
         self._conditions.update(conditions)
+        self._plan = compile_plan(self._conditions, decode=True)
+        self._list_keys = frozenset(k for k, v in self._conditions.items() if isinstance(v, ListAttribute))
 
-    def has_valid_arguments(self, arguments):
-        try:
-            valid_arguments(self.endpoint.__name__, arguments, self._conditions)
-        except ArgumentKeyError as key_error:
-            raise BadRequest(str(key_error))
+    def validate_arguments(self, arguments):
+        """ Validate and decode the request arguments in place, in one pass """
+        return _validate(self.endpoint, arguments, self._plan)
 
+    def has_valid_arguments(self, arguments):
+        self.validate_arguments(dict(arguments))
         return True
 
     def decode_arguments(self, arguments):
-        for key, value in arguments.items():
-            if key in self._conditions:
-                attr = self._conditions[key]
-                if issubclass(attr.attr_type, Model):
-                    arguments[key] = attr.attr_type(**value)
-                elif isinstance(attr, ListAttribute) is False and isinstance(value, list) and len(value) == 1:
-                    arguments[key] = value[0]
+        return self.validate_arguments(arguments)
+
+class CompiledRoute(object):
+    """
+        The state an application precomputes to answer the requests of a
+        route. Routes are shared by every application frozen from the same
+        configuration, so they are left untouched and refreezing cannot
+        change them under a request still running on an older application.
+    """
+
+    def __init__(self, route, codec=None, before=(), after=(), resources=()):
+        self.route = route
+        self.mimetype = route.mimetype
+        self.compress = route.compress
+        self.cache = route.cache
+        self.etag = route.etag
+        self.before_hooks = before
+        self.after_hooks = after
+        self.plan = route._plan
+        self.list_keys = route._list_keys
+        self.wanted = _endpoint_parameters(route.endpoint)
+        self.reads_request = True
+        self.injections = ()
+        if self.wanted is not None:
+            # Parameters named after a resource are injected, never read from the request
+            self.injections = tuple(name for name in self.wanted if name in resources)
+            self.wanted = self.wanted.difference(self.injections).union(route._conditions)
+            self.reads_request = not self.wanted.issubset(route.arguments)
+
+        codec = codec or JSONCodec()
+        self.serializer = self.streamer = None
+        if self.mimetype == 'application/json':
+            self.serializer = partial(_json, dumps=codec.dumps)
+            self.streamer = partial(iter_json, dumps=codec.dumps, binary=codec.binary)
+        elif self.mimetype == 'application/x-ndjson':
+            self.serializer = partial(_ndjson, dumps=codec.dumps, binary=codec.binary)
+            self.streamer = partial(iter_ndjson, dumps=codec.dumps, binary=codec.binary)
+
+    def collect_arguments(self, req, arguments):
+        """
+            Add the query, form and JSON body values the endpoint can take
+            to the URL arguments. Endpoints with a fixed signature only
+            get their parameters and condition keys, and the body is not
+            parsed when those all come from the URL.
+        """
+        if not self.reads_request:
+            return arguments
+
+        wanted, list_keys = self.wanted, self.list_keys
+        for values in (req.args, req.form):
+            if values:
+                for key in (values if wanted is None else wanted):
+                    if key in values:
+                        arguments[key] = values.getlist(key) if key in list_keys else values[key]
+
+        data = req.json
+        if data is not None:
+            if wanted is None:
+                arguments.update(data)
+            else:
+                arguments.update((key, data[key]) for key in wanted if key in data)
 
         return arguments
 
+    def validate_arguments(self, arguments):
+        """ Validate and decode the request arguments in place, in one pass """
+        return _validate(self.route.endpoint, arguments, self.plan)
+
+def _validate(endpoint, arguments, plan):
+    try:
+        return run_plan(endpoint.__name__, arguments, plan)
+    except ArgumentKeyError as key_error:
+        raise BadRequest(str(key_error))
+
+def _json(body, dumps):
+    return dumps(encode_body(body))
+
+def _ndjson(body, dumps, binary=False):
+    items = encode_body(body) if isinstance(body, list) else body
+    items = items if isinstance(items, (list, tuple)) else [items]
+    return (b'' if binary else '').join(iter_ndjson(items, dumps, binary))
+
+def _endpoint_parameters(endpoint):
+    """
+        Names of the keyword arguments a plain function accepts, or None
+        when it takes **kwargs or its signature cannot be relied on.
+    """
+    if not (inspect.isfunction(endpoint) or inspect.ismethod(endpoint)):
+        return None
+
+    try:
+        parameters = inspect.signature(endpoint).parameters.values()
+    except (TypeError, ValueError):
+        return None
+
+    names = set()
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_KEYWORD:
+            return None
+        if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+            names.add(parameter.name)
+    return frozenset(names)
+
 class RouteFactory(RuleFactory):
 
     def __init__(self):
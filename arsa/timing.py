@@ -0,0 +1,35 @@
+""" Request phase timing """
+from time import perf_counter
+
+class PhaseTimer(object):
+    """ Records how long each phase of a request took, in seconds """
+    __slots__ = ('phases', 'start', '_last')
+
+    def __init__(self):
+        self.phases = []
+        self.start = self._last = perf_counter()
+
+    def mark(self, name):
+        """ Close the phase that started at the previous mark """
+        now = perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.start
+
+    def server_timing(self):
+        """ Value for the Server-Timing response header """
+        metrics = ['{};dur={:.3f}'.format(name, duration * 1000) for name, duration in self.phases]
+        metrics.append('total;dur={:.3f}'.format(self.total * 1000))
+        return ', '.join(metrics)
+
+class NullTimer(object):
+    """ Stand-in used when timing is disabled, marks cost a no-op call """
+    __slots__ = ()
+
+    def mark(self, name):
+        pass
+
+NULL_TIMER = NullTimer()
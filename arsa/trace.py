@@ -0,0 +1,237 @@
+""" Lightweight tracing spans """
+import re
+import sys
+import json
+import time
+import random
+import threading
+from contextvars import ContextVar
+from urllib import request as urlrequest
+
+from .globals import _request_ctx_var
+
+# The innermost open span. Unlike the request context it is copied into
+# every asyncio task, so concurrent spans each nest under their own parent.
+_span_var = ContextVar('arsa.span', default=None)
+
+def _trace_id():
+    return '{:032x}'.format(random.getrandbits(128))
+
+def _span_id():
+    return '{:016x}'.format(random.getrandbits(64))
+
+_TRACEPARENT = re.compile(r'([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-|$)')
+
+def parse_traceparent(value):
+    """ Return (trace id, parent id, sampled) from a W3C traceparent header, None if malformed """
+    match = _TRACEPARENT.match(value.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, _ = match.groups()
+    if version == 'ff' or trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+def parse_amzn_trace_id(value):
+    """ Return (trace id, parent id, sampled) from an X-Amzn-Trace-Id header """
+    fields = dict(part.split('=', 1) for part in value.split(';') if '=' in part)
+    root = fields.get('Root', '').split('-')
+    if len(root) != 3:
+        return None
+    sampled = fields.get('Sampled')
+    return root[1] + root[2], fields.get('Parent'), None if sampled is None else sampled == '1'
+
+class Span(object):
+    """ A timed operation, nested under the span that was current when it started """
+
+    def __init__(self, name, trace_id=None, parent_id=None, tracer=None, attributes=None,
+                 kind='internal'):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id or _trace_id()
+        self.span_id = _span_id()
+        self.parent_id = parent_id
+        self.tracer = tracer
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self):
+        return '00-{}-{}-01'.format(self.trace_id, self.span_id)
+
+    def finish(self):
+        self.end = time.time_ns()
+        if self.tracer:
+            self.tracer.record(self)
+
+    def __enter__(self):
+        if _request_ctx_var.get() is not None:
+            self._token = _span_var.set(self)
+        return self
+
+    def __exit__(self, error_type, error, _):
+        if error is not None:
+            self.error = repr(error)
+        if self._token is not None:
+            _span_var.reset(self._token)
+            self._token = None
+        self.finish()
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+def current_span():
+    """ The active span of the current request, if it is traced """
+    active = _span_var.get()
+    if active is None:
+        ctx = _request_ctx_var.get()
+        active = ctx.span if ctx is not None else None
+    return active
+
+def span(name, **attributes):
+    """
+        Start a span under the current one. Outside a traced request the
+        span is timed but not exported.
+    """
+    parent = current_span()
+    if parent is None:
+        return Span(name, attributes=attributes)
+    return Span(name, parent.trace_id, parent.span_id, parent.tracer, attributes)
+
+def inject(headers):
+    """ Add the traceparent of the current span to outgoing request headers """
+    active = current_span()
+    if active is not None:
+        headers['traceparent'] = active.traceparent
+    return headers
+
+class Tracer(object):
+    """
+        Starts a root span for every request, continuing the trace from
+        the traceparent or X-Amzn-Trace-Id header, and exports finished
+        spans in batches at the end of each invocation.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0, max_batch=512):
+        self.exporter = exporter or StdoutExporter()
+        self.sample_rate = sample_rate
+        self.max_batch = max_batch
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def start_request(self, req):
+        parent = None
+        header = req.headers.get('traceparent')
+        if header:
+            parent = parse_traceparent(header)
+        if parent is None:
+            header = req.headers.get('X-Amzn-Trace-Id')
+            if header:
+                parent = parse_amzn_trace_id(header)
+
+        trace_id, parent_id, sampled = parent or (None, None, None)
+        if sampled is None:
+            sampled = self.sample_rate >= 1 or random.random() < self.sample_rate
+        if not sampled:
+            return None
+
+        return Span('{} {}'.format(req.method, req.path), trace_id, parent_id, self, kind='server')
+
+    def record(self, finished):
+        with self._lock:
+            self._spans.append(finished)
+            full = len(self._spans) >= self.max_batch
+        if full:
+            self.flush()
+
+    def flush(self):
+        """ Export the finished spans. Exporter errors are reported, never raised into a request """
+        with self._lock:
+            spans, self._spans = self._spans, []
+
+        if spans:
+            try:
+                self.exporter([finished.to_dict() for finished in spans])
+            except Exception as error: # pylint: disable=broad-except
+                print('Exporting {} spans failed: {!r}\n'.format(len(spans), error))
+
+class StdoutExporter(object):
+    """ Writes spans as JSON lines to a stream, stdout by default """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, spans):
+        _write_lines(self.stream or sys.stdout, spans)
+
+class FileExporter(object):
+    """ Appends spans as JSON lines to a file """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, spans):
+        with open(self.path, 'a') as stream:
+            _write_lines(stream, spans)
+
+def _write_lines(stream, spans):
+    stream.write(''.join(json.dumps(item, separators=(',', ':')) + '\n' for item in spans))
+    stream.flush()
+
+class OTLPExporter(object):
+    """ Posts spans as OTLP/HTTP JSON, for example to a local collector """
+
+    def __init__(self, endpoint='http://localhost:4318/v1/traces', service_name='arsa', timeout=2):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def payload(self, spans):
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "arsa"},
+                    "spans": [{
+                        "traceId": item['traceId'],
+                        "spanId": item['spanId'],
+                        "parentSpanId": item['parentId'] or '',
+                        "name": item['name'],
+                        "kind": 2 if item['kind'] == 'server' else 1,
+                        "startTimeUnixNano": str(item['start']),
+                        "endTimeUnixNano": str(item['end']),
+                        "attributes": [
+                            {"key": key, "value": {"stringValue": str(value)}}
+                            for key, value in item['attributes'].items()
+                        ],
+                        "status": {"code": 2, "message": item['error']} if item['error'] else {}
+                    } for item in spans]
+                }]
+            }]
+        }
+
+    def __call__(self, spans):
+        req = urlrequest.Request(
+            self.endpoint,
+            data=json.dumps(self.payload(spans)).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        urlrequest.urlopen(req, timeout=self.timeout).close()
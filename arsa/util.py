@@ -1,5 +1,14 @@
+import asyncio
+import threading
+from array import array
 from functools import singledispatch
 from werkzeug.exceptions import HTTPException
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from .model import Model
 from .exceptions import Redirect
 
@@ -11,7 +20,7 @@ def to_serializable(val):
 @to_serializable.register(Model)
 def ts_model(val):
     """Used if *val* is an instance of our Model class."""
-    return val.attributes
+    return val._encoder(val)
 
 @to_serializable.register(HTTPException)
 def ts_model(val):
@@ -27,3 +36,69 @@ def ts_model(val):
     return {
         "error": val.location
     }
+
+@to_serializable.register(array)
+def ts_array(val):
+    """Used for lists received as arrays."""
+    return val.tolist()
+
+if numpy is not None:
+    @to_serializable.register(numpy.ndarray)
+    def ts_ndarray(val):
+        """Used for lists received as NumPy arrays."""
+        return val.tolist()
+
+STREAM_CHUNK_SIZE = 16384
+
+def _chunked(parts):
+    """ Group small encoded parts into chunks of about STREAM_CHUNK_SIZE """
+    buf, size = [], 0
+    for part in parts:
+        buf.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            yield buf[0][:0].join(buf)
+            buf, size = [], 0
+
+    if buf:
+        yield buf[0][:0].join(buf)
+
+def iter_json(items, dumps, binary=False):
+    """
+        Encode an iterable as a JSON array, one element at a time.
+        ``binary`` is set when ``dumps`` returns bytes.
+    """
+    start, separator, end = (b'[', b', ', b']') if binary else ('[', ', ', ']')
+
+    def parts():
+        yield start
+        first = True
+        for item in items:
+            if first:
+                first = False
+                yield dumps(item)
+            else:
+                yield separator
+                yield dumps(item)
+        yield end
+
+    return _chunked(parts())
+
+def iter_ndjson(items, dumps, binary=False):
+    """ Encode an iterable as newline delimited JSON """
+    newline = b'\n' if binary else '\n'
+    return _chunked(dumps(item) + newline for item in items)
+
+_loops = threading.local()
+
+def run_sync(awaitable):
+    """
+        Run an awaitable to completion on the event loop of the current
+        thread. The loop is kept open so warm invocations reuse it.
+    """
+    loop = getattr(_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    return loop.run_until_complete(awaitable)
@@ -1,36 +1,303 @@
-import re
+import json
+import base64
 from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+from werkzeug.exceptions import BadRequest
+from werkzeug.utils import cached_property
+from werkzeug.urls import url_decode, url_encode, url_unquote_plus
+from werkzeug.http import parse_options_header, parse_cookie
+from werkzeug.formparser import parse_form_data
+from werkzeug.datastructures import Headers, ImmutableMultiDict
 
-class AWSEnvironBuilder(EnvironBuilder):
+def _strip_stage(path, stage):
+    path = path or '/'
+    if stage:
+        prefix = '/{}/'.format(stage)
+        if path.startswith(prefix):
+            return path[len(prefix) - 1:]
+    return path
 
-    def __init__(self, event, context):
-        query_string = None
-        if 'queryStringParameters' in event:
-            if isinstance(event['queryStringParameters'], dict):
-                query_string = '&'.join(
-                    ['{}={}'.format(k, v) for k, v in event['queryStringParameters'].items()]
-                )
-
-        if 'stage' in event['requestContext']:
-            stage = event['requestContext']['stage']
-            path = re.sub(r'^/%s/' % stage, '/', event['path'])
-        else:
-            path = event['path']
-
-        super(AWSEnvironBuilder, self).__init__(
-            path=path,
-            method=event['httpMethod'],
-            headers=event['headers'],
-            data=event['body'],
-            query_string=query_string
-        )
+def _encode_body(response):
+    """ Text bodies are sent as is, compressed and binary ones base64 encoded """
+    data = response.get_data()
+    if 'Content-Encoding' not in response.headers:
+        try:
+            return data.decode('utf-8'), False
+        except UnicodeDecodeError:
+            pass
+
+    return base64.b64encode(data).decode('ascii'), True
+
+class JSONBodyMixin(object):
+    """
+        Parses the request body as JSON on first access of ``json``, with
+        the codec the application assigns to ``codec``.
+    """
+    codec = None
+
+    # The matched route, set by the application once routing succeeded
+    url_rule = None
+
+    @cached_property
+    def json(self):
+        data = self.data
+        if not data:
+            return None
+        try:
+            return (self.codec or json).loads(data)
+        except ValueError:
+            raise BadRequest("JSON body was malformed")
 
+    @property
+    def is_json(self):
+        mimetype = self.mimetype
+        return mimetype == 'application/json' or (
+            mimetype.startswith('application/') and mimetype.endswith('+json'))
 
-        self.request_context = event.get('requestContext', None)
+    def get_json(self, force=False, silent=False):
+        """ werkzeug style access to ``json``, None unless the body is declared JSON or ``force`` """
+        if not (force or self.is_json):
+            return None
+        try:
+            return self.json
+        except BadRequest:
+            if silent:
+                return None
+            raise
+
+class WSGIRequest(JSONBodyMixin, Request):
+    """ werkzeug request with the body parsed by the application codec """
+
+class AWSRequest(JSONBodyMixin):
+    """
+        Request object read straight from an API Gateway REST API proxy
+        event. It exposes the parts of the werkzeug request used by
+        endpoints without building a WSGI environ unless ``environ`` is
+        accessed.
+    """
+
+    def __init__(self, event, context):
+        self.event = event
         self.lambda_context = context
+        self.request_context = event.get('requestContext') or {}
+
+    @cached_property
+    def method(self):
+        return self.event['httpMethod'].upper()
+
+    @cached_property
+    def path(self):
+        return _strip_stage(self.event['path'], self.request_context.get('stage'))
 
-    def get_environ(self):
-        environ = super(AWSEnvironBuilder, self).get_environ()
+    @cached_property
+    def protocol(self):
+        return self.request_context.get('protocol', 'HTTP/1.1')
+
+    @cached_property
+    def request_id(self):
+        return getattr(self.lambda_context, 'aws_request_id', None) or self.request_context.get('requestId')
+
+    @cached_property
+    def content_length(self):
+        return len(self.body)
+
+    @cached_property
+    def args(self):
+        multi = self.event.get('multiValueQueryStringParameters')
+        if multi:
+            return ImmutableMultiDict([(k, v) for k, values in multi.items() for v in values])
+
+        return ImmutableMultiDict(self.event.get('queryStringParameters') or {})
+
+    @cached_property
+    def headers(self):
+        return Headers(self.event.get('headers') or {})
+
+    @cached_property
+    def cookies(self):
+        return parse_cookie(self.headers.get('Cookie', ''))
+
+    @cached_property
+    def mimetype(self):
+        return parse_options_header(self.headers.get('Content-Type', ''))[0].lower()
+
+    @cached_property
+    def body(self):
+        """ Raw request body as bytes """
+        body = self.event.get('body')
+        if not body:
+            return b''
+        if self.event.get('isBase64Encoded'):
+            return base64.b64decode(body)
+        return body.encode('utf-8') if isinstance(body, str) else body
+
+    @cached_property
+    def data(self):
+        # Mirror werkzeug, form encoded bodies are consumed by ``form``
+        if self.mimetype in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+            return b''
+        return self.body
+
+    @cached_property
+    def form(self):
+        if self.mimetype == 'application/x-www-form-urlencoded':
+            return url_decode(self.body, cls=ImmutableMultiDict)
+        elif self.mimetype == 'multipart/form-data':
+            return parse_form_data(self.environ)[1]
+        return ImmutableMultiDict()
+
+    @cached_property
+    def environ(self):
+        """ WSGI environ, only built for code that asks for it """
+        builder = EnvironBuilder(
+            path=self.path,
+            method=self.method,
+            headers=self.headers,
+            data=self.body,
+            query_string=url_encode(self.args)
+        )
+        builder.close()
+        environ = builder.get_environ()
         environ['aws.requestContext'] = self.request_context
         environ['aws.lambdaContext'] = self.lambda_context
+        if self.source_ip:
+            environ['REMOTE_ADDR'] = self.source_ip
+        if self.headers.get('X-Forwarded-Proto') in ('http', 'https'):
+            environ['wsgi.url_scheme'] = self.headers['X-Forwarded-Proto']
         return environ
+
+    @cached_property
+    def source_ip(self):
+        identity = self.request_context.get('identity') or self.request_context.get('http') or {}
+        return identity.get('sourceIp')
+
+    @cached_property
+    def _werkzeug_request(self):
+        return Request(self.environ)
+
+    def __getattr__(self, name):
+        # Anything else a werkzeug request offers is answered by one built from the environ
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._werkzeug_request, name)
+
+    def proxy_response(self, response):
+        """ Format a response for the event source that sent the request """
+        body, is_base64 = _encode_body(response)
+        return {
+            "statusCode": response.status_code,
+            "headers": dict(response.headers),
+            "body": body,
+            "isBase64Encoded": is_base64
+        }
+
+class HTTPAPIRequest(AWSRequest):
+    """ Request read from an API Gateway HTTP API payload format 2.0 event """
+
+    @cached_property
+    def method(self):
+        return self.request_context['http']['method'].upper()
+
+    @cached_property
+    def path(self):
+        stage = self.request_context.get('stage')
+        return _strip_stage(self.event.get('rawPath'), None if stage == '$default' else stage)
+
+    @cached_property
+    def protocol(self):
+        return self.request_context['http'].get('protocol', 'HTTP/1.1')
+
+    @cached_property
+    def args(self):
+        # queryStringParameters joins repeated keys with commas
+        return url_decode(self.event.get('rawQueryString') or '', cls=ImmutableMultiDict)
+
+    @cached_property
+    def headers(self):
+        headers = Headers(self.event.get('headers') or {})
+        cookies = self.event.get('cookies')
+        if cookies:
+            headers['Cookie'] = '; '.join(cookies)
+        return headers
+
+    def proxy_response(self, response):
+        headers = {}
+        for key, value in response.headers:
+            if key.lower() != 'set-cookie':
+                headers[key] = '{},{}'.format(headers[key], value) if key in headers else value
+
+        body, is_base64 = _encode_body(response)
+        return {
+            "statusCode": response.status_code,
+            "headers": headers,
+            "cookies": response.headers.getlist('Set-Cookie'),
+            "body": body,
+            "isBase64Encoded": is_base64
+        }
+
+class ALBRequest(AWSRequest):
+    """ Request read from an Application Load Balancer target group event """
+
+    def __init__(self, event, context):
+        super(ALBRequest, self).__init__(event, context)
+        self.multi_value = 'multiValueHeaders' in event
+
+    @cached_property
+    def source_ip(self):
+        forwarded = self.headers.get('X-Forwarded-For')
+        return forwarded.split(',')[0].strip() if forwarded else None
+
+    @cached_property
+    def path(self):
+        return self.event['path'] or '/'
+
+    @cached_property
+    def protocol(self):
+        return 'HTTP/1.1'
+
+    @cached_property
+    def args(self):
+        # The load balancer passes query parameters through still encoded
+        multi = self.event.get('multiValueQueryStringParameters')
+        if multi is None:
+            multi = {k: [v] for k, v in (self.event.get('queryStringParameters') or {}).items()}
+
+        return ImmutableMultiDict([
+            (url_unquote_plus(k), url_unquote_plus(v)) for k, values in multi.items() for v in values
+        ])
+
+    @cached_property
+    def headers(self):
+        if self.multi_value:
+            return Headers([
+                (k, v) for k, values in (self.event['multiValueHeaders'] or {}).items() for v in values
+            ])
+        return Headers(self.event.get('headers') or {})
+
+    def proxy_response(self, response):
+        body, is_base64 = _encode_body(response)
+        proxy = {
+            "statusCode": response.status_code,
+            "statusDescription": response.status,
+            "body": body,
+            "isBase64Encoded": is_base64
+        }
+
+        if self.multi_value:
+            headers = {}
+            for key, value in response.headers:
+                headers.setdefault(key, []).append(value)
+            proxy['multiValueHeaders'] = headers
+        else:
+            proxy['headers'] = dict(response.headers)
+
+        return proxy
+
+def make_request(event, context):
+    """ Create the request object matching the shape of a Lambda event """
+    if event.get('version') == '2.0':
+        return HTTPAPIRequest(event, context)
+    elif 'elb' in (event.get('requestContext') or {}):
+        return ALBRequest(event, context)
+
+    return AWSRequest(event, context)
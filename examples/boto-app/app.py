@@ -3,10 +3,12 @@ import boto3
 from arsa import Arsa
 app = Arsa()
 
+# Built on first use and reused by every warm invocation of the container
+app.resource('s3', lambda: boto3.client('s3'))
+
 @app.route("/buckets")
-def list_buckets():
+def list_buckets(s3):
     """ List buckets """
-    client = boto3.client('s3')
-    buckets = client.list_buckets()
+    buckets = s3.list_buckets()
 
     return buckets
@@ -0,0 +1,50 @@
+import io
+import json
+import time
+import pytest
+
+from arsa.accesslog import AccessLogger
+
+def record(status=200):
+    return {'status': status, 'route': '/foobar'}
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_buffered_until_end_of_invocation():
+    stream = io.StringIO()
+    logger = AccessLogger(stream=stream)
+    logger.log(record())
+    logger.log(record(404))
+    assert stream.getvalue() == ''
+
+    logger.end_invocation()
+    assert lines(stream) == [record(), record(404)]
+
+def test_sample_successes_only():
+    stream = io.StringIO()
+    logger = AccessLogger(stream=stream, sample_rate=0)
+    logger.log(record())
+    logger.log(record(500))
+    logger.end_invocation()
+    assert lines(stream) == [record(500)]
+
+def test_max_buffer():
+    stream = io.StringIO()
+    logger = AccessLogger(stream=stream, max_buffer=2)
+    logger.log(record())
+    logger.log(record())
+    assert len(lines(stream)) == 2
+
+def test_background_flush():
+    stream = io.StringIO()
+    logger = AccessLogger(stream=stream, flush_interval=0.01)
+    logger.log(record())
+    logger.end_invocation()
+
+    for _ in range(100):
+        if stream.getvalue():
+            break
+        time.sleep(0.01)
+
+    assert lines(stream) == [record()]
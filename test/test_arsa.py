@@ -250,6 +250,18 @@ def test_middleware(app):
     response = client.get('/foobar')
     assert response.data == b'"userface"'
 
+def test_middleware_response(app):
+    func = MagicMock(testfunc, return_value='endpoint')
+    app.route('/foobar')(func)
+    app.add_middleware(lambda: Response('maintenance', status=503) if request.path == '/foobar' else None)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert response.status_code == 503
+    assert response.data == b'maintenance'
+    func.assert_not_called()
+    assert client.get('/bad/path').status_code == 404
+
 def test_html_mime_type(app):
     func = MagicMock(testfunc, return_value='<html><body><p>HI</p></body></html>')
     app.route('/coolwebsite', content_type='application/html')(func)
@@ -278,3 +290,515 @@ def test_custom_error_handler(app):
     assert response.status_code == 400
     assert response.data == b'"bad"'
     assert response.content_type == 'application/json'
+
+def test_handler_query_param_with_ampersand(app):
+    func = MagicMock(testfunc, side_effect=lambda q, **kwargs: q)
+    app.route('/foo')(app.required(q=str)(func))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy_w_stage_w_query.json')))
+    event['queryStringParameters'] = {'q': 'salt&pepper'}
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['body'] == '"salt&pepper"'
+
+def test_handler_base64_body(app):
+    func = MagicMock(testfunc, side_effect=lambda name, **kwargs: name)
+    app.route('/users', methods=['POST'])(app.required(name=str)(func))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/post_proxy.json')))
+    event['body'] = 'eyJuYW1lIjoidGVzdCJ9'
+    event['isBase64Encoded'] = True
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['body'] == '"test"'
+
+def test_handler_request_environ(app):
+    func = MagicMock(testfunc, side_effect=lambda **kwargs: request.environ['aws.requestContext']['stage'])
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy_w_stage.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['body'] == '"prod"'
+
+def test_handler_werkzeug_request_attributes(app):
+    def func(**kwargs):
+        return [request.url, request.host, request.remote_addr, request.query_string.decode('ascii'),
+                request.values['foo'], request.get_data(as_text=True), request.is_json,
+                request.user_agent.string, len(request.files)]
+
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == [
+        'https://1234567890.execute-api.us-east-1.amazonaws.com/users?foo=bar',
+        '1234567890.execute-api.us-east-1.amazonaws.com', '127.0.0.1', 'foo=bar', 'bar',
+        '{"test":"body"}', False, 'Custom User Agent String', 0
+    ]
+
+def test_freeze_reused(app):
+    func = MagicMock(testfunc, return_value='response')
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    frozen = app.freeze()
+    app.handler(event, {})
+    app.handler(event, {})
+    assert app.freeze() is frozen
+    assert app.create_app() is frozen
+
+def test_freeze_invalidated_by_new_route(app):
+    app.route('/foobar')(MagicMock(testfunc, return_value='foo'))
+    frozen = app.freeze()
+
+    app.route('/barfoo')(MagicMock(testfunc, return_value='bar'))
+    assert app.freeze() is not frozen
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/foobar').data == b'"foo"'
+    assert client.get('/barfoo').data == b'"bar"'
+
+def test_freeze_threads(app):
+    from concurrent.futures import ThreadPoolExecutor
+
+    app.route('/foobar')(MagicMock(testfunc, return_value='foo'))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        frozen = set(pool.map(lambda _: id(app.freeze()), range(32)))
+
+    assert len(frozen) == 1
+
+def test_async_route(app):
+    import asyncio
+
+    async def fetch(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def func():
+        return await asyncio.gather(fetch('a'), fetch('b'))
+
+    app.route('/foobar')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert response.status_code == 200
+    assert response.data == b'["a", "b"]'
+
+def test_async_loop_persists(app):
+    import asyncio
+
+    async def func(**kwargs):
+        return id(asyncio.get_running_loop())
+
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    first = app.handler(event, {})
+    second = app.handler(event, {})
+    assert first['body'] == second['body']
+
+def test_async_middleware(app):
+    async def middleware():
+        g.user = 'userface'
+
+    app.add_middleware(middleware)
+
+    async def func():
+        return g.user
+
+    app.route('/foobar')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert response.data == b'"userface"'
+
+def test_http_api_handler(app):
+    func = MagicMock(testfunc, side_effect=lambda Happy, **kwargs: [Happy, request.args.getlist('animal'), request.cookies['theme']])
+    app.route('/foo')(app.required(Happy=str)(func))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/http_api_v2.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['isBase64Encoded'] is False
+    assert response['cookies'] == []
+    assert json.loads(response['body']) == ['dance', ['dog', 'cat'], 'dark']
+
+def test_alb_handler(app):
+    func = MagicMock(testfunc, side_effect=lambda Happy, **kwargs: [Happy, request.args.getlist('animal')])
+    app.route('/foo')(app.required(Happy=str)(func))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/alb.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['statusDescription'] == '200 OK'
+    assert response['multiValueHeaders']['Content-Type'] == ['application/json']
+    assert json.loads(response['body']) == ['dance party', ['dog', 'cat']]
+
+def test_stream_json_route(app):
+    func = MagicMock(testfunc, side_effect=lambda: ({'id': i} for i in range(3)))
+    app.route('/foobar')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.data == json.dumps([{'id': i} for i in range(3)]).encode('utf-8')
+
+def test_stream_ndjson_route(app):
+    def func(**kwargs):
+        for i in range(3):
+            yield {'id': i, 'user': request.args['user']}
+
+    app.route('/foobar', content_type='application/x-ndjson')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar?user=bob')
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+    assert response.data.splitlines() == [json.dumps({'id': i, 'user': 'bob'}).encode('utf-8') for i in range(3)]
+
+def test_stream_handler_buffered(app):
+    func = MagicMock(testfunc, side_effect=lambda **kwargs: iter(['a', 'b']))
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 200
+    assert response['body'] == '["a", "b"]'
+
+def test_stream_handler_error(app):
+    def func(**kwargs):
+        yield 'a'
+        raise BadRequest('broken stream')
+
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    response = app.handler(event, {})
+    assert response['statusCode'] == 400
+
+def test_compressed_handler():
+    import base64, gzip
+
+    app = Arsa(compress=True, compress_threshold=10)
+    func = MagicMock(testfunc, return_value=['response'] * 100)
+    app.route('/users')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    response = app.handler(event, {})
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(base64.b64decode(response['body']))) == ['response'] * 100
+
+def test_compress_route_opt_out():
+    app = Arsa(compress=True, compress_threshold=10)
+    func = MagicMock(testfunc, return_value=['response'] * 100)
+    app.route('/foobar', compress=False)(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.data) == ['response'] * 100
+
+def test_binary_handler(app):
+    import base64
+
+    func = MagicMock(testfunc, return_value=b'\x89PNG\r\n\x1a\n\x00\xff')
+    app.route('/users', content_type='image/png')(func)
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    response = app.handler(event, {})
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Type'] == 'image/png'
+    assert base64.b64decode(response['body']) == b'\x89PNG\r\n\x1a\n\x00\xff'
+
+def test_server_timing():
+    app = Arsa(server_timing=True)
+    func = MagicMock(testfunc, return_value='response')
+    app.route('/foobar')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    phases = [metric.split(';')[0] for metric in response.headers['Server-Timing'].split(', ')]
+    assert phases == ['middleware', 'match', 'parse', 'validate', 'endpoint', 'serialize', 'total']
+
+def test_timing_hook(app):
+    timings = []
+    app.add_timing_hook(lambda rule, timer: timings.append((rule.rule if rule else None, dict(timer.phases))))
+    app.route('/foobar')(MagicMock(testfunc, return_value='response'))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert 'Server-Timing' not in response.headers
+    client.get('/bad/path')
+
+    assert timings[0][0] == '/foobar'
+    assert timings[0][1]['endpoint'] >= 0
+    assert timings[1] == (None, {'middleware': timings[1][1]['middleware']})
+
+def test_timing_disabled(app):
+    app.route('/foobar')(MagicMock(testfunc, return_value='response'))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert 'Server-Timing' not in response.headers
+
+def test_access_log_handler():
+    import io
+    from arsa.accesslog import AccessLogger
+
+    stream = io.StringIO()
+    app = Arsa(access_log=AccessLogger(stream=stream))
+    app.route('/users')(MagicMock(testfunc, return_value='response'))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    app.handler(event, {})
+    record = json.loads(stream.getvalue())
+    assert record['route'] == '/users'
+    assert record['status'] == 200
+    assert record['requestId'] == event['requestContext']['requestId']
+    assert record['responseBytes'] == len('"response"')
+
+def test_access_log_unhandled_error():
+    import io
+    from arsa.accesslog import AccessLogger
+
+    stream = io.StringIO()
+    app = Arsa(access_log=AccessLogger(stream=stream))
+    app.route('/users')(MagicMock(testfunc, side_effect=KeyError('boom')))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    with pytest.raises(KeyError):
+        app.handler(event, {})
+    record = json.loads(stream.getvalue())
+    assert record['route'] == '/users'
+    assert record['status'] == 500
+    assert record['responseBytes'] is None
+
+def test_access_log_streamed():
+    import io
+    from arsa.accesslog import AccessLogger
+
+    stream = io.StringIO()
+    app = Arsa(access_log=AccessLogger(stream=stream))
+    app.route('/users')(MagicMock(testfunc, side_effect=lambda: iter(['a', 'b'])))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/users')
+    assert response.is_streamed
+    assert response.data == b'["a", "b"]'
+    assert json.loads(stream.getvalue())['responseBytes'] is None
+
+def test_access_log_disabled(capsys):
+    app = Arsa(access_log=False)
+    app.route('/users')(MagicMock(testfunc, return_value='response'))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    app.handler(event, {})
+    assert capsys.readouterr().out == ''
+
+def test_metrics_handler():
+    import io
+    from arsa.metrics import MetricsRegistry
+
+    stream = io.StringIO()
+    app = Arsa(access_log=False, metrics=MetricsRegistry(stream=stream))
+    app.route('/users')(MagicMock(testfunc, return_value='response'))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    app.handler(event, {})
+    doc = json.loads(stream.getvalue())
+    assert doc['Route'] == '/users'
+    assert doc['Requests'] == 1
+    assert app.metrics.snapshot()['GET /users']['count'] == 1
+
+def test_metrics_unhandled_error():
+    from arsa.metrics import MetricsRegistry
+
+    app = Arsa(access_log=False, metrics=MetricsRegistry())
+    app.route('/users')(MagicMock(testfunc, side_effect=KeyError('boom')))
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+
+    with pytest.raises(KeyError):
+        app.handler(event, {})
+    stats = app.metrics.snapshot()['GET /users']
+    assert stats['count'] == 1
+    assert stats['statuses'] == {500: 1}
+
+def test_context_teardown_on_unhandled_error(app):
+    from arsa.globals import _request_ctx_stack
+
+    errors = []
+    app.add_teardown(errors.append)
+    app.add_teardown(lambda error: g.user)
+
+    def func():
+        g.user = 'userface'
+        raise KeyError('boom')
+
+    app.route('/foobar')(func)
+    client = Client(app.create_app(), response_wrapper=Response)
+
+    with pytest.raises(KeyError):
+        client.get('/foobar')
+
+    assert _request_ctx_stack.top is None
+    assert isinstance(errors[0], KeyError)
+
+def test_teardown_after_stream():
+    app = Arsa(access_log=False)
+    errors = []
+    app.add_teardown(errors.append)
+
+    def func():
+        yield 'a'
+        raise KeyError('broken stream')
+
+    app.route('/foobar')(func)
+    client = Client(app.create_app(), response_wrapper=Response)
+    with pytest.raises(KeyError):
+        client.get('/foobar', buffered=True)
+    assert len(errors) == 1
+    assert isinstance(errors[0], KeyError)
+
+def test_teardown_success(app):
+    errors = []
+    app.add_teardown(errors.append)
+    app.route('/foobar')(MagicMock(testfunc, return_value='response'))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    client.get('/foobar')
+    client.get('/bad/path')
+    assert errors == [None, None]
+
+def test_arguments_follow_signature(app):
+    @app.route('/items/<name>', methods=['POST'])
+    def item(name, count):
+        return [name, count]
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/items/foo?count=2&other=1', data='{"count": 3, "extra": true}',
+                           content_type='application/json')
+    assert response.status_code == 200
+    assert json.loads(response.data) == ['foo', 3]
+
+def test_body_not_parsed_for_url_arguments(app):
+    @app.route('/items/<name>', methods=['POST'])
+    def item(name):
+        return [name, 'json' in request.__dict__]
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/items/foo', data='{not json', content_type='application/json')
+    assert response.status_code == 200
+    assert json.loads(response.data) == ['foo', False]
+
+def test_lazy_request_json(app):
+    @app.route('/raw', methods=['POST'])
+    def raw():
+        return request.json['values']
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/raw', data='{"values": [1, 2]}', content_type='application/json')
+    assert json.loads(response.data) == [1, 2]
+
+    response = client.post('/raw', data='{bad', content_type='application/json')
+    assert response.status_code == 400
+
+def test_before_hook_short_circuit(app):
+    func = MagicMock(testfunc, return_value='endpoint')
+    app.route('/admin/stats')(func)
+    app.route('/public')(MagicMock(testfunc, return_value='public'))
+
+    seen = []
+    app.add_before_hook(lambda rule: seen.append(rule.rule))
+    app.add_before_hook(lambda rule: {'cached': True}, prefix='/admin')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/admin/stats')
+    assert json.loads(response.data) == {'cached': True}
+    func.assert_not_called()
+
+    response = client.get('/public')
+    assert response.data == b'"public"'
+    assert seen == ['/admin/stats', '/public']
+
+def test_hook_prefix_segments(app):
+    app.route('/user')(MagicMock(testfunc, return_value='user'))
+    app.route('/user/<name>')(MagicMock(testfunc, return_value='name'))
+    app.route('/users')(MagicMock(testfunc, return_value='users'))
+    app.add_before_hook(lambda rule: 'hooked', prefix='/user/')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/user').data == b'"hooked"'
+    assert client.get('/user/foo').data == b'"hooked"'
+    assert client.get('/users').data == b'"users"'
+
+def test_before_hook_unrouted_path(app):
+    app.route('/api/users')(MagicMock(testfunc, return_value='users'))
+    rules = []
+    app.add_before_hook(lambda rule: rules.append(rule) or {'error': 'gone'}, prefix='/api', unrouted=True)
+    app.add_before_hook(lambda rule: rule.endpoint and None, prefix='/api')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/api/old')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'error': 'gone'}
+    assert rules == [None]
+    assert client.get('/other').status_code == 404
+
+    with pytest.raises(ValueError):
+        app.add_before_hook(lambda rule: None, route='/api/users', unrouted=True)
+
+def test_before_hook_not_called_unrouted(app):
+    app.route('/admin/stats')(MagicMock(testfunc, return_value='stats'))
+    app.add_before_hook(lambda rule: rule.endpoint and None, prefix='/admin')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/admin/typo').status_code == 404
+    assert client.get('/admin/stats').data == b'"stats"'
+
+def test_before_hook_response(app):
+    func = MagicMock(testfunc, return_value='endpoint')
+    app.route('/foobar')(func)
+    app.add_before_hook(lambda rule: Response('denied', status=403), route=func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert response.status_code == 403
+    assert response.data == b'denied'
+
+def test_refreeze_keeps_old_application(app):
+    app.route('/users')(MagicMock(testfunc, return_value='users'))
+    old = app.create_app()
+    app.add_before_hook(lambda rule: 'hooked')
+    new = app.create_app()
+
+    assert new is not old
+    assert Client(old, response_wrapper=Response).get('/users').data == b'"users"'
+    assert Client(new, response_wrapper=Response).get('/users').data == b'"hooked"'
+
+def test_after_hooks(app):
+    app.route('/foobar')(MagicMock(testfunc, return_value='response'))
+    app.route('/other')(MagicMock(testfunc, return_value='other'))
+
+    order = []
+    def first(rule, response):
+        order.append('first')
+        response.headers['X-First'] = '1'
+
+    def second(rule, response):
+        order.append('second')
+        return Response('replaced')
+
+    app.add_after_hook(first)
+    app.add_after_hook(second, route='/foobar')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/foobar')
+    assert order == ['second', 'first']
+    assert response.data == b'replaced'
+    assert response.headers['X-First'] == '1'
+
+    response = client.get('/other')
+    assert response.data == b'"other"'
@@ -0,0 +1,68 @@
+import time
+import pytest
+
+from unittest.mock import MagicMock
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.cache import CachePolicy
+
+def testfunc():
+    pass
+
+def _client(app):
+    return Client(app.create_app(), response_wrapper=Response)
+
+def test_cache_hits():
+    app = Arsa(access_log=None)
+    func = MagicMock(testfunc, return_value={'data': [1, 2]})
+    app.route('/reference', cache=CachePolicy(ttl=60))(func)
+
+    client = _client(app)
+    first = client.get('/reference?b=2&a=1')
+    second = client.get('/reference?a=1&b=2')
+    assert first.data == second.data == b'{"data": [1, 2]}'
+    assert second.headers['Content-Type'] == 'application/json'
+    assert func.call_count == 1
+
+    client.get('/reference?a=2')
+    assert func.call_count == 2
+
+def test_cache_vary():
+    app = Arsa(access_log=None)
+    func = MagicMock(testfunc, return_value='response')
+    app.route('/reference', cache=CachePolicy(vary=['Accept-Language']))(func)
+
+    client = _client(app)
+    client.get('/reference', headers={'Accept-Language': 'en'})
+    client.get('/reference', headers={'Accept-Language': 'fr'})
+    client.get('/reference', headers={'Accept-Language': 'en'})
+    assert func.call_count == 2
+
+def test_cache_expiry_and_size():
+    policy = CachePolicy(ttl=0.01, max_entries=1)
+    policy.set('a', Response('a'))
+    policy.set('b', Response('b'))
+    assert policy.get('a') is None
+    assert policy.get('b').get_data() == b'b'
+    time.sleep(0.02)
+    assert policy.get('b') is None
+
+def test_cache_errors_not_stored():
+    policy = CachePolicy()
+    policy.set('a', Response('missing', status=404))
+    assert policy.get('a') is None
+
+def test_cache_directory(tmpdir):
+    policy = CachePolicy(directory=str(tmpdir))
+    policy.set('a', Response('cached', headers={'X-Test': '1'}))
+    policy.clear()
+
+    response = policy.get('a')
+    assert response.get_data() == b'cached'
+    assert response.headers['X-Test'] == '1'
+
+def test_cache_get_only():
+    app = Arsa(access_log=None)
+    with pytest.raises(ValueError):
+        app.route('/reference', methods=['POST'], cache=CachePolicy())
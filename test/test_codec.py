@@ -0,0 +1,83 @@
+import json
+import pytest
+from functools import partial
+from unittest.mock import MagicMock
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.codec import get_codec, JSONCodec
+from arsa.model import Model, Attribute
+from arsa.util import to_serializable, iter_json, iter_ndjson
+
+class Thing(Model):
+    name = Attribute(str)
+
+BACKENDS = ['json', 'orjson', 'ujson', 'rapidjson']
+
+def _codec(name):
+    if name != 'json':
+        pytest.importorskip(name)
+    return get_codec(name)
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_roundtrip(name):
+    codec = _codec(name)
+    encoded = codec.dumps({"thing": Thing(name='foo'), "path": "a/b"})
+    assert isinstance(encoded, bytes if codec.binary else str)
+    assert json.loads(encoded) == {"thing": {"name": "foo"}, "path": "a/b"}
+    assert codec.loads(b'{"name": "foo"}') == {"name": "foo"}
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_streamed(name):
+    codec = _codec(name)
+    array = b''.join(_bytes(c) for c in iter_json(iter([1, 2]), codec.dumps, codec.binary))
+    assert json.loads(array) == [1, 2]
+    lines = b''.join(_bytes(c) for c in iter_ndjson(iter([1, 2]), codec.dumps, codec.binary))
+    assert lines.splitlines() == [b'1', b'2']
+
+def _bytes(chunk):
+    return chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+
+def test_default_codec():
+    assert isinstance(get_codec(), JSONCodec)
+    assert get_codec('auto').loads('[1]') == [1]
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+
+def test_codec_instance():
+    codec = JSONCodec()
+    assert get_codec(codec) is codec
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_app_codec(name):
+    _codec(name)
+    app = Arsa(json_codec=name, access_log=None)
+
+    @app.route('/echo', methods=['POST'])
+    def echo(name):
+        return Thing(name=name)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/echo', data=json.dumps({'name': 'foo'}), content_type='application/json')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"name": "foo"}
+
+    response = client.post('/echo', data='{bad', content_type='application/json')
+    assert response.status_code == 400
+    assert json.loads(response.data)['description'] == 'JSON body was malformed'
+
+def test_models_skip_default_hook():
+    codec = JSONCodec()
+    default = MagicMock(side_effect=to_serializable)
+    codec.dumps = partial(json.dumps, default=default)
+    app = Arsa(json_codec=codec, access_log=None)
+    app.route('/things')(lambda: [Thing(name='a'), Thing(name='b')])
+    app.route('/thing')(lambda: Thing(name='a'))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert json.loads(client.get('/things').data) == [{'name': 'a'}, {'name': 'b'}]
+    assert json.loads(client.get('/thing').data) == {'name': 'a'}
+    assert not default.called
@@ -0,0 +1,44 @@
+import gzip
+import zlib
+import pytest
+
+from werkzeug.wrappers import Response
+from arsa.compression import Compressor
+
+BODY = b'{"name": "foobar"}' * 100
+
+def test_gzip():
+    response = Compressor(threshold=10)(Response(BODY), 'gzip, deflate')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.get_data()) == BODY
+
+def test_deflate_quality():
+    response = Compressor(threshold=10)(Response(BODY), 'gzip;q=0.5, deflate')
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(response.get_data()) == BODY
+
+def test_below_threshold():
+    response = Compressor(threshold=len(BODY) + 1)(Response(BODY), 'gzip')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == BODY
+
+def test_not_accepted():
+    response = Compressor(threshold=10)(Response(BODY), 'identity')
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+def test_skip_images():
+    response = Compressor(threshold=10)(Response(BODY, mimetype='image/png'), 'gzip')
+    assert 'Content-Encoding' not in response.headers
+
+def test_weakens_etag():
+    response = Response(BODY)
+    response.set_etag('v1')
+    response = Compressor(threshold=10)(response, 'gzip')
+    assert response.headers['ETag'] == 'W/"v1"'
+
+    response = Response(BODY)
+    response.set_etag('v1')
+    response = Compressor(threshold=10)(response, 'identity')
+    assert response.headers['ETag'] == '"v1"'
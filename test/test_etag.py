@@ -0,0 +1,97 @@
+import os
+import json
+
+from unittest.mock import MagicMock
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+
+def testfunc():
+    pass
+
+def _event(**headers):
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+    event['headers'].update(headers)
+    return event
+
+def test_body_etag():
+    app = Arsa(access_log=None)
+    func = MagicMock(testfunc, side_effect=lambda **kwargs: ['a', 'b'])
+    app.route('/users', etag=True)(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/users')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+
+    response = client.get('/users', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get('/users', headers={'If-None-Match': '"other"'})
+    assert response.status_code == 200
+
+def test_body_etag_proxy():
+    app = Arsa(access_log=None)
+    app.route('/users', etag=True)(MagicMock(testfunc, side_effect=lambda **kwargs: 'users'))
+
+    response = app.handler(_event(), {})
+    etag = response['headers']['ETag']
+
+    response = app.handler(_event(**{'If-None-Match': 'W/' + etag}), {})
+    assert response['statusCode'] == 304
+    assert response['body'] == ''
+
+def test_endpoint_etag_skips_endpoint():
+    app = Arsa(access_log=None)
+    func = MagicMock(testfunc, side_effect=lambda **kwargs: 'users')
+    app.route('/users', etag=lambda **kwargs: 'v1')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/users')
+    assert response.headers['ETag'] == '"v1"'
+    assert func.call_count == 1
+
+    response = client.get('/users', headers={'If-None-Match': '"v1"'})
+    assert response.status_code == 304
+    assert func.call_count == 1
+
+def test_if_modified_since():
+    app = Arsa(access_log=None)
+
+    @app.route('/users')
+    def users():
+        response = Response('users')
+        response.headers['Last-Modified'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        return response
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/users', headers={'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+    assert response.status_code == 304
+
+    response = client.get('/users', headers={'If-Modified-Since': 'Tue, 20 Oct 2015 07:28:00 GMT'})
+    assert response.status_code == 200
+
+def test_endpoint_etag_ignored_for_writes():
+    app = Arsa(access_log=None)
+    func = MagicMock(testfunc, side_effect=lambda **kwargs: 'saved')
+    app.route('/users', methods=['PUT'], etag=lambda **kwargs: 'v1')(func)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.put('/users', headers={'If-None-Match': '"v1"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"v1"'
+    assert func.call_count == 1
+
+def test_body_etag_compressed():
+    app = Arsa(access_log=None, compress=True, compress_threshold=10)
+    app.route('/users', etag=True)(MagicMock(testfunc, side_effect=lambda **kwargs: 'users' * 10))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    identity = client.get('/users').headers['ETag']
+    response = client.get('/users', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == 'W/' + identity
+
+    response = client.get('/users', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
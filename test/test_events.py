@@ -0,0 +1,160 @@
+import pytest
+import json
+import asyncio
+import base64
+
+from arsa import Arsa
+from arsa.model import Model, Attribute
+
+class Order(Model):
+    id = Attribute(str)
+    total = Attribute(int)
+
+def sqs_record(message_id, body, queue='orders', group=None):
+    record = {
+        'messageId': message_id,
+        'body': body,
+        'attributes': {},
+        'eventSource': 'aws:sqs',
+        'eventSourceARN': 'arn:aws:sqs:us-east-1:123456789012:{}'.format(queue)
+    }
+    if group:
+        record['attributes']['MessageGroupId'] = group
+    return record
+
+def kinesis_record(sequence, data):
+    return {
+        'kinesis': {
+            'sequenceNumber': sequence,
+            'data': base64.b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+        },
+        'eventSource': 'aws:kinesis',
+        'eventSourceARN': 'arn:aws:kinesis:us-east-1:123456789012:stream/clicks'
+    }
+
+@pytest.fixture(autouse=True)
+def app():
+    return Arsa()
+
+def test_sqs_model(app):
+    seen = []
+
+    @app.sqs('orders', model=Order)
+    def process(order):
+        seen.append(order.total)
+
+    event = {'Records': [
+        sqs_record('1', json.dumps({'id': 'a', 'total': 10})),
+        sqs_record('2', json.dumps({'id': 'b', 'total': 20}))
+    ]}
+
+    response = app.handler(event, {})
+    assert response == {'batchItemFailures': []}
+    assert sorted(seen) == [10, 20]
+
+def test_sqs_async_consumer(app):
+    seen = []
+
+    @app.sqs('orders', model=Order)
+    async def process(order):
+        await asyncio.sleep(0)
+        if order.total < 0:
+            raise ValueError('negative total')
+        seen.append(order.total)
+
+    event = {'Records': [
+        sqs_record('1', json.dumps({'id': 'a', 'total': 10})),
+        sqs_record('2', json.dumps({'id': 'b', 'total': -1}))
+    ]}
+
+    response = app.handler(event, {})
+    assert response == {'batchItemFailures': [{'itemIdentifier': '2'}]}
+    assert seen == [10]
+
+def test_sqs_poison_record(app):
+
+    @app.sqs('orders', model=Order)
+    def process(order):
+        pass
+
+    event = {'Records': [
+        sqs_record('1', json.dumps({'id': 'a', 'total': 10})),
+        sqs_record('2', json.dumps({'id': 'b', 'total': 'twenty'})),
+        sqs_record('3', 'not json')
+    ]}
+
+    response = app.handler(event, {})
+    assert response == {'batchItemFailures': [{'itemIdentifier': '2'}, {'itemIdentifier': '3'}]}
+
+def test_sqs_fifo_group_stops_after_failure(app):
+    seen = []
+
+    @app.sqs('orders.fifo')
+    def process(body):
+        if body == 'bad':
+            raise ValueError(body)
+        seen.append(body)
+
+    event = {'Records': [
+        sqs_record('1', 'bad', queue='orders.fifo', group='a'),
+        sqs_record('2', 'after', queue='orders.fifo', group='a'),
+        sqs_record('3', 'other', queue='orders.fifo', group='b')
+    ]}
+
+    response = app.handler(event, {})
+    assert response == {'batchItemFailures': [{'itemIdentifier': '1'}, {'itemIdentifier': '2'}]}
+    assert seen == ['other']
+
+def test_sqs_queue_routing(app):
+    seen = []
+    app.sqs('orders')(lambda body: seen.append(('orders', body)))
+    app.sqs('refunds')(lambda body: seen.append(('refunds', body)))
+
+    event = {'Records': [sqs_record('1', '"x"', queue='refunds')]}
+    app.handler(event, {})
+    assert seen == [('refunds', 'x')]
+
+def test_unknown_queue(app):
+    app.sqs('orders')(lambda body: None)
+
+    with pytest.raises(ValueError):
+        app.handler({'Records': [sqs_record('1', '{}', queue='other')]}, {})
+
+def test_kinesis_ordered(app):
+    seen = []
+
+    @app.stream('clicks')
+    def process(click):
+        if click['n'] == 2:
+            raise ValueError('boom')
+        seen.append(click['n'])
+
+    event = {'Records': [kinesis_record(str(n), {'n': n}) for n in range(1, 5)]}
+
+    response = app.handler(event, {})
+    assert seen == [1]
+    assert response == {'batchItemFailures': [
+        {'itemIdentifier': '2'}, {'itemIdentifier': '3'}, {'itemIdentifier': '4'}
+    ]}
+
+def test_dynamodb_stream(app):
+    seen = []
+    app.stream('Orders', source='dynamodb', model=Order)(seen.append)
+
+    event = {'Records': [{
+        'eventSource': 'aws:dynamodb',
+        'eventName': 'INSERT',
+        'eventSourceARN': 'arn:aws:dynamodb:us-east-1:123456789012:table/Orders/stream/2020-01-01T00:00:00.000',
+        'dynamodb': {
+            'SequenceNumber': '100',
+            'NewImage': {'id': {'S': 'a'}, 'total': {'N': '42'}}
+        }
+    }]}
+
+    response = app.handler(event, {})
+    assert response == {'batchItemFailures': []}
+    assert seen[0].total == 42
+
+def test_unknown_stream_source(app):
+    with pytest.raises(ValueError):
+        app.stream('foo', source='kafka')
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import pytest
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.ctx import RequestContext
+from arsa.globals import (request, g, current_request, current_g, _request_ctx_stack,
+                          copy_current_request_context, ContextThreadPoolExecutor)
+
+def _client(app):
+    return Client(app.create_app(), response_wrapper=Response)
+
+def test_fast_accessors():
+    app = Arsa(access_log=None)
+
+    @app.route('/foobar')
+    def foobar():
+        current_g().user = 'userface'
+        return [current_request() is request._get_current_object(), g.user]
+
+    assert _client(app).get('/foobar').data == b'[true, "userface"]'
+
+def test_outside_request():
+    with pytest.raises(RuntimeError):
+        current_request()
+    with pytest.raises(RuntimeError):
+        request.path
+
+def test_stack_shim():
+    ctx = RequestContext('request')
+    _request_ctx_stack.push(ctx)
+    assert request._get_current_object() == 'request'
+    assert _request_ctx_stack.pop() is ctx
+    assert _request_ctx_stack.top is None
+    assert _request_ctx_stack.pop() is None
+
+def test_thread_pool_context():
+    app = Arsa(access_log=None)
+    executor = ContextThreadPoolExecutor(max_workers=2)
+
+    @app.route('/foobar')
+    def foobar():
+        return list(executor.map(lambda _: request.path, range(2)))
+
+    assert _client(app).get('/foobar').data == b'["/foobar", "/foobar"]'
+
+def test_thread_context():
+    app = Arsa(access_log=None)
+
+    @app.route('/foobar')
+    def foobar():
+        result = []
+        thread = threading.Thread(target=copy_current_request_context(lambda: result.append(request.path)))
+        thread.start()
+        thread.join()
+        return result
+
+    assert _client(app).get('/foobar').data == b'["/foobar"]'
+
+def test_asyncio_context():
+    app = Arsa(access_log=None)
+
+    async def path():
+        await asyncio.sleep(0)
+        return request.path
+
+    @app.route('/foobar')
+    async def foobar():
+        return await asyncio.gather(path(), asyncio.ensure_future(path()))
+
+    assert _client(app).get('/foobar').data == b'["/foobar", "/foobar"]'
+
+def test_streamed_context():
+    app = Arsa(access_log=None)
+
+    @app.route('/foobar')
+    def foobar():
+        return (request.path for _ in range(2))
+
+    assert _client(app).get('/foobar').data == b'["/foobar", "/foobar"]'
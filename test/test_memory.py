@@ -0,0 +1,57 @@
+import os
+import json
+import tracemalloc
+import pytest
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.globals import g
+from arsa.memory import MemoryAccountant
+
+LEAK = []
+
+@pytest.fixture(autouse=True)
+def stop_tracing():
+    yield
+    tracemalloc.stop()
+    del LEAK[:]
+
+def test_peak_per_route():
+    memory = MemoryAccountant()
+    app = Arsa(access_log=False, memory=memory)
+    app.route('/big')(lambda: len(bytearray(2 * 1024 * 1024)))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    client.get('/big')
+
+    stats = memory.snapshot()['/big']
+    assert stats['requests'] == 1
+    assert stats['peak'] >= 2 * 1024 * 1024
+    assert stats['retained'] < 1024 * 1024
+
+def test_report_retained_memory():
+    reports = []
+    app = Arsa(access_log=False, memory=MemoryAccountant(threshold=512 * 1024, report=reports.append))
+    app.route('/leak')(lambda: LEAK.append(bytearray(1024 * 1024)) or 'leaked')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    client.get('/leak')
+
+    assert len(reports) == 1
+    assert reports[0]['route'] == '/leak'
+    assert reports[0]['retained'] >= 1024 * 1024
+
+def test_request_state_not_retained():
+    reports = []
+    app = Arsa(access_log=False, memory=MemoryAccountant(threshold=512 * 1024, report=reports.append))
+
+    @app.route('/users')
+    def users():
+        g.buffer = bytearray(1024 * 1024)
+        return 'users'
+
+    event = json.load(open(os.path.join(os.path.dirname(__file__), 'requests/get_proxy.json')))
+    assert app.handler(event, {})['statusCode'] == 200
+    assert reports == []
+    assert app.memory.snapshot()['/users']['requests'] == 1
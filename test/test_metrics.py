@@ -0,0 +1,67 @@
+import io
+import json
+import pytest
+
+from arsa.metrics import Histogram, MetricsRegistry
+
+class FakeRule(object):
+    rule = '/users'
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(float(value))
+
+    assert histogram.count == 100
+    assert histogram.max == 100
+    assert 40 <= histogram.percentile(50) <= 60
+    assert 88 <= histogram.percentile(99) <= 100
+    assert len(histogram.counts) == len(Histogram.BOUNDS) + 1
+
+def test_histogram_bounded():
+    histogram = Histogram()
+    histogram.record(10 ** 9)
+    histogram.record(0)
+    assert len(histogram.counts) == len(Histogram.BOUNDS) + 1
+    assert histogram.percentile(100) == Histogram.BOUNDS[-1]
+
+def test_emf_document():
+    stream = io.StringIO()
+    registry = MetricsRegistry(namespace='Test', stream=stream)
+    registry.record(FakeRule(), 'GET', 200, 5.0)
+    registry.record(FakeRule(), 'GET', 404, 5.0)
+    registry.record(None, 'GET', 500, 1.0)
+    registry.end_invocation()
+
+    docs = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(docs) == 2
+
+    doc = docs[0]
+    assert doc['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'Test'
+    assert doc['Route'] == '/users'
+    assert doc['Method'] == 'GET'
+    assert doc['Requests'] == 2
+    assert doc['4xx'] == 1
+    assert doc['5xx'] == 0
+    assert sum(doc['Latency']['Counts']) == 2
+    assert docs[1]['Route'] == 'unmatched'
+    assert docs[1]['5xx'] == 1
+
+def test_emf_delta_and_snapshot():
+    stream = io.StringIO()
+    registry = MetricsRegistry(stream=stream, flush_every=2)
+    registry.record(FakeRule(), 'GET', 200, 5.0)
+    registry.end_invocation()
+    assert stream.getvalue() == ''
+
+    registry.record(FakeRule(), 'GET', 200, 5.0)
+    registry.end_invocation()
+    registry.record(FakeRule(), 'GET', 200, 5.0)
+    registry.flush()
+
+    docs = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [doc['Requests'] for doc in docs] == [2, 1]
+
+    snapshot = registry.snapshot()
+    assert snapshot['GET /users']['count'] == 3
+    assert snapshot['GET /users']['statuses'] == {200: 3}
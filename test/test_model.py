@@ -3,7 +3,7 @@ from unittest.mock import MagicMock
 from werkzeug.exceptions import BadRequest
 
 from arsa.model import Model, Attribute, ListAttribute
-from arsa.model import valid_arguments
+from arsa.model import valid_arguments, compile_plan, run_plan
 from arsa.exceptions import ArgumentKeyError
 
 class FooModel(Model):
@@ -81,3 +81,129 @@ def test_raw_list_attribute():
     }
 
     valid_arguments(__name__, arguments, conditions)
+
+class NestedModel(Model):
+    foo = Attribute(FooModel)
+    foobars = Attribute(FooBarsModel)
+
+def test_serialize_flat():
+    model = FooModel(name='bar')
+    assert model.serialize() is model.attribute_values
+
+def test_serialize_nested():
+    model = NestedModel(foo={'name': 'a'}, foobars={'foos': [{'name': 'b'}]})
+    assert model.serialize() == {
+        'foo': {'name': 'a'},
+        'foobars': {'foos': [{'name': 'b'}]}
+    }
+    assert NestedModel(foobars={'foos': []}).serialize() == {'foobars': {'foos': []}}
+
+def test_invalid_argument_path():
+    conditions = {'foobars': Attribute(FooBarsModel)}
+    arguments = {'foobars': {'foos': [{'name': 'bar'}, {'name': 1}]}}
+
+    with pytest.raises(ArgumentKeyError) as error:
+        valid_arguments('endpoint', arguments, conditions)
+    assert str(error.value) == "argument endpoint.foobars.foos.1.name was not of the type <class 'str'>"
+
+    with pytest.raises(ArgumentKeyError) as error:
+        valid_arguments('endpoint', {}, conditions)
+    assert str(error.value) == "argument endpoint.foobars was not detected."
+
+class CompactModel(Model):
+    __compact__ = True
+    name = Attribute(str)
+    foo = Attribute(FooModel, optional=True)
+
+class CompactChildModel(CompactModel):
+    count = Attribute(int, optional=True)
+
+def test_compact_model():
+    model = CompactModel(name='bar', foo={'name': 'baz'})
+    assert not hasattr(model, '__dict__')
+    assert not hasattr(model, '__weakref__')
+    assert model.name == 'bar'
+    assert model.foo.name == 'baz'
+    assert model.attributes == {'name': 'bar', 'foo': model.foo}
+    assert model.serialize() == {'name': 'bar', 'foo': {'name': 'baz'}}
+
+    model.name = 'qux'
+    assert model['name'] == 'qux'
+    assert CompactModel(name='bar').foo is None
+    assert CompactModel(name='bar').serialize() == {'name': 'bar'}
+    assert CompactModel(name='bar', foo=None).serialize() == {'name': 'bar', 'foo': None}
+    with pytest.raises(AttributeError):
+        model.unknown
+
+    with pytest.raises(ValueError):
+        CompactModel(bad='bar')
+
+def test_compact_inheritance():
+    model = CompactChildModel(name='bar', count=2)
+    assert set(CompactChildModel._attributes) == {'name', 'foo', 'count'}
+    assert CompactChildModel.__slots__ == ('count',)
+    assert model.serialize() == {'name': 'bar', 'count': 2}
+    with pytest.raises(ArgumentKeyError):
+        valid_arguments('endpoint', {'child': {'count': 2}}, {'child': Attribute(CompactChildModel)})
+
+def test_from_many():
+    models = FooBarsModel.from_many([{'foos': [{'name': 'a'}]}, {'foos': []}])
+    assert [len(model.foos) for model in models] == [1, 0]
+    assert models[0].foos[0].name == 'a'
+
+    compact = CompactModel.from_many([{'name': 'a'}, {'name': 'b', 'foo': {'name': 'c'}}])
+    assert [model.name for model in compact] == ['a', 'b']
+    assert compact[1].foo.name == 'c'
+
+    with pytest.raises(ValueError):
+        FooModel.from_many([{'bad': 'bar'}])
+
+def test_plain_list_attribute():
+    class TagsModel(Model):
+        tags = Attribute(list)
+
+    assert TagsModel(tags=['a', 1]).serialize() == {'tags': ['a', 1]}
+    assert valid_arguments('endpoint', {'tags': ['a', 1]}, {'tags': Attribute(list)})
+    with pytest.raises(ArgumentKeyError):
+        valid_arguments('endpoint', {'tags': 'a'}, {'tags': Attribute(list)})
+
+def test_primitive_list():
+    conditions = {'values': ListAttribute(typeof=int)}
+    assert valid_arguments('endpoint', {'values': list(range(1000))}, conditions)
+
+    with pytest.raises(ArgumentKeyError) as error:
+        valid_arguments('endpoint', {'values': [1, 2, 'three']}, conditions)
+    assert str(error.value) == "argument endpoint.values.2 was not of the type <class 'int'>"
+
+@pytest.mark.parametrize('typecode', ['q', 'numpy'])
+def test_array_list(typecode):
+    if typecode == 'numpy':
+        pytest.importorskip('numpy')
+    plan = compile_plan({'values': ListAttribute(typeof=int, array=typecode)}, decode=True)
+
+    decoded = run_plan('endpoint', {'values': [1, 2, 3]}, plan)
+    assert list(decoded['values']) == [1, 2, 3]
+    assert not isinstance(decoded['values'], list)
+
+    assert len(run_plan('endpoint', {'values': []}, plan)['values']) == 0
+
+    with pytest.raises(ArgumentKeyError) as error:
+        run_plan('endpoint', {'values': [1, 2.5]}, plan)
+    assert str(error.value) == "argument endpoint.values.1 was not of the type <class 'int'>"
+
+@pytest.mark.parametrize('typecode', ['u', 'numpy'])
+def test_array_list_checks_items(typecode):
+    if typecode == 'numpy':
+        pytest.importorskip('numpy')
+    plan = compile_plan({'values': ListAttribute(typeof=str, array=typecode)}, decode=True)
+    assert list(run_plan('endpoint', {'values': ['a', 'b']}, plan)['values']) == ['a', 'b']
+
+    with pytest.raises(ArgumentKeyError) as error:
+        run_plan('endpoint', {'values': ['a', 1, 2.5]}, plan)
+    assert str(error.value) == "argument endpoint.values.1 was not of the type <class 'str'>"
+
+def test_numpy_float_list_rejects_ints():
+    pytest.importorskip('numpy')
+    plan = compile_plan({'values': ListAttribute(typeof=float, array='numpy')}, decode=True)
+    with pytest.raises(ArgumentKeyError):
+        run_plan('endpoint', {'values': [1, 2.5]}, plan)
@@ -0,0 +1,67 @@
+import os
+import json
+import time
+import pytest
+import cProfile
+
+from unittest.mock import MagicMock
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.profiler import SlowRequestProfiler, FileSink
+
+def slow(items):
+    time.sleep(0.01)
+    return len(items)
+
+def test_profile_slow_request():
+    reports = []
+    app = Arsa(profiler=SlowRequestProfiler(threshold=5, sample_rate=1, sink=lambda report, profile: reports.append(report)))
+    app.route('/slow', methods=['POST'])(slow)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/slow', data=json.dumps({'items': [1, 2, 3]}))
+    assert response.data == b'3'
+
+    assert len(reports) == 1
+    assert reports[0]['route'] == '/slow'
+    assert reports[0]['endpoint'] == 'slow'
+    assert reports[0]['arguments'] == {'items': 'list[3]'}
+    assert reports[0]['duration'] >= 5
+    assert 'sleep' in reports[0]['stats']
+
+def test_fast_request_not_reported():
+    sink = MagicMock()
+    app = Arsa(profiler=SlowRequestProfiler(threshold=10000, sample_rate=1, sink=sink))
+    app.route('/fast')(lambda: 'fast')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/fast').data == b'"fast"'
+    assert not sink.called
+
+def test_file_sink(tmpdir):
+    profiler = SlowRequestProfiler(threshold=0, sample_rate=1, sink=FileSink(str(tmpdir)))
+    rule = MagicMock(rule='/slow', endpoint=slow)
+    assert profiler(rule, {'items': []}, lambda endpoint, arguments: endpoint(**arguments)) == 0
+
+    files = sorted(os.listdir(str(tmpdir)))
+    assert [os.path.splitext(name)[1] for name in files] == ['.json', '.prof']
+
+def test_sink_errors_do_not_fail_requests():
+    def sink(report, profile):
+        raise OSError('No space left on device')
+
+    app = Arsa(access_log=False, profiler=SlowRequestProfiler(threshold=0, sample_rate=1, sink=sink))
+    app.route('/slow', methods=['POST'])(slow)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.post('/slow', data=json.dumps({'items': [1, 2]}))
+    assert response.data == b'2'
+
+def test_file_sink_unique_names(tmpdir):
+    sink = FileSink(str(tmpdir))
+    profile = cProfile.Profile()
+    profile.runcall(slow, [])
+    report = {'time': time.time(), 'route': '/slow'}
+    assert sink(report, profile) != sink(report, profile)
+    assert len(os.listdir(str(tmpdir))) == 4
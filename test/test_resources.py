@@ -0,0 +1,103 @@
+import threading
+import pytest
+
+from unittest.mock import MagicMock
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa
+from arsa.globals import g
+from arsa.resources import Resource
+
+def test_parameter_injection():
+    app = Arsa(access_log=None)
+    factory = MagicMock(return_value='client')
+    app.resource('client', factory)
+
+    @app.route('/items')
+    def items(client):
+        return client
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/items?client=other').data == b'"client"'
+    assert client.get('/items').data == b'"client"'
+    assert factory.call_count == 1
+
+def test_g_access():
+    app = Arsa(access_log=None)
+    app.resource('client', lambda: 'client')
+
+    @app.route('/items')
+    def items():
+        return [g.client, 'client' in g]
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/items').data == b'["client", false]'
+
+def test_thread_scope():
+    resource = Resource('client', object, scope='thread')
+    instances = []
+    thread = threading.Thread(target=lambda: instances.append(resource.acquire()))
+    thread.start()
+    thread.join()
+
+    assert resource.acquire() is resource.acquire()
+    assert resource.acquire() is not instances[0]
+
+def test_pool_scope():
+    app = Arsa(access_log=None)
+    resource = app.resource('conn', object, scope='pool', size=2)
+
+    @app.route('/items')
+    def items(conn):
+        return id(conn)
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    first = client.get('/items').data
+    assert client.get('/items').data == first
+    assert resource._pool.qsize() == 1
+
+    lent = [resource.acquire(), resource.acquire()]
+    assert lent[0] is not lent[1]
+
+def test_shutdown():
+    shutdown = MagicMock()
+    app = Arsa(access_log=None)
+    resource = app.resource('client', object, shutdown=shutdown)
+    instance = resource.acquire()
+
+    app.close_resources()
+    shutdown.assert_called_once_with(instance)
+    assert resource.acquire() is not instance
+
+def test_unknown_scope():
+    with pytest.raises(ValueError):
+        Resource('client', object, scope='request')
+
+def test_context_freed_without_collection():
+    import gc
+    import weakref
+    from arsa.ctx import RequestContext
+
+    gc.disable()
+    try:
+        ctx = RequestContext(None, {'client': Resource('client', object)})
+        assert ctx.g.client is ctx.g.client
+        freed = weakref.ref(ctx)
+        del ctx
+        assert freed() is None
+    finally:
+        gc.enable()
+
+def test_pool_released_after_stream():
+    app = Arsa(access_log=None)
+    resource = app.resource('conn', object, scope='pool', size=1)
+
+    @app.route('/items')
+    def items(conn):
+        return (resource._pool.qsize() for _ in range(2))
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/items')
+    assert response.data == b'[0, 0]'
+    response.close()
+    assert resource._pool.qsize() == 1
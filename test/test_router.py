@@ -0,0 +1,92 @@
+import random
+import pytest
+
+from werkzeug.routing import Map, Rule
+from werkzeug.exceptions import HTTPException
+from arsa.router import Router
+
+RULES = [
+    ('/', None),
+    ('/users', ['GET']),
+    ('/users', ['POST']),
+    ('/users/', ['PUT']),
+    ('/users/<name>', ['GET', 'DELETE']),
+    ('/users/<int:id>', ['GET']),
+    ('/users/<int:id>/posts/', ['GET']),
+    ('/users/<name>/posts/<float:score>', ['GET']),
+    ('/users/me', ['GET']),
+    ('/items/<string(length=2):code>', ['GET']),
+    ('/items/<uuid:key>', None),
+    ('/items/<int(min=10):big>/', ['GET']),
+    ('/<page>', ['GET']),
+    ('/<page>/', ['POST']),
+    ('/a/<b>/c', ['GET']),
+    ('/a/b/<c>', ['GET']),
+]
+
+PATHS = [
+    '/', '', '//', '/users', '/users/', '/users/bob', '/users/me', '/users/42', '/users/042',
+    '/users/42/posts', '/users/42/posts/', '/users/bob/posts/1.5', '/users/bob/posts/1',
+    '/items/ab', '/items/abc', '/items/8c8a0eb8-6b2f-4d1e-a4d1-1c4e2b9b1f53', '/items/12',
+    '/items/5', '/items/12/', '/foo', '/foo/', '/foo/bar', '/a/b/c', '/a/x/c', '/a/b/x',
+    '//users', '/users//bob', '/users/bob/'
+]
+
+def _outcome(call):
+    try:
+        rule, arguments = call()
+        return rule.rule, sorted(rule.methods or ()), arguments
+    except HTTPException as error:
+        return type(error).__name__, getattr(error, 'new_url', None)
+
+def _map(rules):
+    return Map(rules=[Rule(rule, methods=methods, endpoint=str(index))
+                      for index, (rule, methods) in enumerate(rules)]).bind('arsa.io')
+
+@pytest.mark.parametrize('cache_size', [0, 16])
+def test_matches_werkzeug(cache_size):
+    adapter = _map(RULES)
+    router = Router(adapter, cache_size=cache_size)
+    assert router.native
+
+    for _ in range(2):
+        for path in PATHS:
+            for method in ('GET', 'POST', 'PUT', 'DELETE', 'PATCH'):
+                expected = _outcome(lambda: adapter.match(path, method=method, return_rule=True))
+                assert _outcome(lambda: router.match(path, method)) == expected, (method, path)
+
+def test_random_rule_sets():
+    generator = random.Random(7)
+    parts = ['a', 'b', '<x>', '<int:n>', '<float:f>']
+    paths = ['a', 'b', '1', '2.5', 'z']
+
+    for _ in range(50):
+        rules = []
+        for _ in range(generator.randint(1, 12)):
+            rule = '/' + '/'.join(generator.choice(parts).replace('x', 'x%d' % i).replace(':n', ':n%d' % i)
+                                  .replace(':f', ':f%d' % i) for i in range(generator.randint(1, 3)))
+            if generator.random() < 0.3:
+                rule += '/'
+            rules.append((rule, generator.choice([None, ['GET'], ['POST'], ['GET', 'POST']])))
+
+        adapter = _map(rules)
+        router = Router(adapter)
+        for _ in range(40):
+            path = '/' + '/'.join(generator.choice(paths) for _ in range(generator.randint(1, 3)))
+            if generator.random() < 0.3:
+                path += '/'
+            method = generator.choice(['GET', 'POST'])
+            expected = _outcome(lambda: adapter.match(path, method=method, return_rule=True))
+            assert _outcome(lambda: router.match(path, method)) == expected, (rules, method, path)
+
+def test_complex_rules_use_werkzeug():
+    adapter = _map([('/files/<path:name>', ['GET']), ('/files/<name>', ['GET'])])
+    router = Router(adapter)
+    assert not router.native
+    assert router.match('/files/a/b', 'GET')[1] == {'name': 'a/b'}
+
+def test_cached_arguments_are_copied():
+    router = Router(_map(RULES))
+    arguments = router.match('/users/bob', 'GET')[1]
+    arguments['extra'] = True
+    assert router.match('/users/bob', 'GET')[1] == {'name': 'bob'}
@@ -1,9 +1,10 @@
 import pytest
+from array import array
 from unittest.mock import MagicMock
 from werkzeug.exceptions import BadRequest
 
 from arsa.routes import Route
-from arsa.model import Model, Attribute
+from arsa.model import Model, Attribute, ListType
 
 def testfunc():
     pass
@@ -53,3 +54,25 @@ def test_reserved_route():
 
     with pytest.raises(ValueError):
         route.add_validation(query=bool)
+
+class Numbers(ListType):
+    _type = float
+    _array = 'd'
+
+def test_array_route():
+    func = MagicMock(testfunc, return_value=True)
+    route = Route(func)
+
+    route.add_validation(values=Numbers)
+    decoded = route.validate_arguments({'values': [1.5, 2.5]})
+    assert decoded['values'] == array('d', [1.5, 2.5])
+
+    with pytest.raises(BadRequest):
+        route.validate_arguments({'values': [1.5, 'two']})
+
+def test_plain_list_route():
+    route = Route(MagicMock(testfunc))
+    route.add_validation(tags=list)
+    assert route.validate_arguments({'tags': ['a', 'b']}) == {'tags': ['a', 'b']}
+    with pytest.raises(BadRequest):
+        route.validate_arguments({'tags': 'a'})
@@ -0,0 +1,112 @@
+import io
+import asyncio
+import json
+import pytest
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from arsa import Arsa, trace
+from arsa.trace import Tracer, StdoutExporter, OTLPExporter, parse_traceparent, parse_amzn_trace_id
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+def traced_app():
+    stream = io.StringIO()
+    app = Arsa(access_log=False, tracer=Tracer(StdoutExporter(stream)))
+
+    def users():
+        with trace.span('dynamo.query', table='users') as query:
+            with trace.span('dynamo.page'):
+                pass
+            return trace.inject({})['traceparent'].split('-')[2] == query.span_id
+
+    app.route('/users')(users)
+    return app, stream
+
+def exported(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_parse_headers():
+    assert parse_traceparent('00-{}-{}-01'.format(TRACE_ID, PARENT_ID)) == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent('garbage') is None
+    assert parse_traceparent('00-{}-{}-zz'.format(TRACE_ID, PARENT_ID)) is None
+    assert parse_traceparent('00-{}-{}-01'.format('x' * 32, PARENT_ID)) is None
+    assert parse_traceparent('00-{}-{}-01'.format(TRACE_ID, '0' * 16)) is None
+    assert parse_amzn_trace_id('Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f42cd8ad8;Sampled=0') == \
+        ('5759e988bd862e3fe1be46a994272793', '53995c3f42cd8ad8', False)
+
+def test_nested_spans():
+    app, stream = traced_app()
+    client = Client(app.create_app(), response_wrapper=Response)
+    response = client.get('/users', headers={'traceparent': '00-{}-{}-01'.format(TRACE_ID, PARENT_ID)})
+    assert response.data == b'true'
+
+    page, query, root = exported(stream)
+    assert [page['name'], query['name'], root['name']] == ['dynamo.page', 'dynamo.query', 'GET /users']
+    assert {page['traceId'], query['traceId'], root['traceId']} == {TRACE_ID}
+    assert root['parentId'] == PARENT_ID
+    assert root['kind'] == 'server'
+    assert root['attributes']['http.status_code'] == 200
+    assert query['parentId'] == root['spanId']
+    assert page['parentId'] == query['spanId']
+    assert query['attributes'] == {'table': 'users'}
+
+def test_unsampled_request():
+    app, stream = traced_app()
+    client = Client(app.create_app(), response_wrapper=Response)
+    client.get('/users', headers={'X-Amzn-Trace-Id': 'Root=1-5759e988-bd862e3fe1be46a994272793;Sampled=0'})
+    assert stream.getvalue() == ''
+
+def test_span_outside_request():
+    with trace.span('standalone') as standalone:
+        assert trace.current_span() is None
+    assert standalone.end >= standalone.start
+
+def test_otlp_payload():
+    item = trace.Span('GET /users', TRACE_ID, PARENT_ID, kind='server', attributes={'http.route': '/users'})
+    item.finish()
+
+    payload = OTLPExporter().payload([item.to_dict()])
+    otlp = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+    assert otlp['traceId'] == TRACE_ID
+    assert otlp['parentSpanId'] == PARENT_ID
+    assert otlp['kind'] == 2
+    assert otlp['attributes'] == [{'key': 'http.route', 'value': {'stringValue': '/users'}}]
+
+def test_file_exporter(tmpdir):
+    path = str(tmpdir.join('spans.jsonl'))
+    trace.FileExporter(path)([{'name': 'a'}])
+    trace.FileExporter(path)([{'name': 'b'}])
+    assert [json.loads(line)['name'] for line in open(path)] == ['a', 'b']
+
+def test_exporter_errors_do_not_fail_requests():
+    def exporter(spans):
+        raise ConnectionError('collector down')
+
+    app = Arsa(access_log=False, tracer=Tracer(exporter, max_batch=1))
+    app.route('/users')(lambda: 'users')
+
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/users').status_code == 200
+
+def test_concurrent_spans():
+    stream = io.StringIO()
+    app = Arsa(access_log=False, tracer=Tracer(StdoutExporter(stream)))
+
+    async def query(name):
+        with trace.span(name) as outer:
+            await asyncio.sleep(0)
+            with trace.span(name + '.page') as inner:
+                await asyncio.sleep(0)
+                return inner.parent_id == outer.span_id
+
+    async def users():
+        return all(await asyncio.gather(query('a'), query('b')))
+
+    app.route('/users')(users)
+    client = Client(app.create_app(), response_wrapper=Response)
+    assert client.get('/users').data == b'true'
+
+    spans = {item['name']: item for item in exported(stream)}
+    assert spans['a']['parentId'] == spans['b']['parentId'] == spans['GET /users']['spanId']
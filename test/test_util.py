@@ -1,8 +1,8 @@
 import pytest
 import json
 
-from arsa.util import to_serializable
-from arsa.model import Model, Attribute
+from arsa.util import to_serializable, iter_json, iter_ndjson
+from arsa.model import Model, Attribute, ListAttribute
 from arsa.exceptions import Redirect
 
 class SampleModel(Model):
@@ -26,3 +26,26 @@ def test_serialize_redirect():
     model = Redirect('http://example.com')
     raw = json.dumps(model, default=to_serializable)
     assert raw == '{"error": "http://example.com"}'
+
+def test_iter_json_matches_dumps():
+    items = [{'name': 'Foo', 'id': i} for i in range(5000)]
+    chunks = list(iter_json(iter(items), json.dumps))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == json.dumps(items)
+    assert ''.join(iter_json(iter([]), json.dumps)) == '[]'
+
+def test_iter_ndjson():
+    raw = ''.join(iter_ndjson(iter([1, 'two', {'three': 3}]), json.dumps))
+    assert raw == '1\n"two"\n{"three": 3}\n'
+
+def test_serialize_array_lists():
+    numpy = pytest.importorskip('numpy')
+
+    class Readings(Model):
+        values = ListAttribute(typeof=float, array='d')
+        samples = ListAttribute(typeof=float, array='numpy')
+
+    model = Readings(values=[1.5, 2.5], samples=[1.0, 2.0])
+    assert isinstance(model.samples, numpy.ndarray)
+    raw = json.dumps(model, default=to_serializable)
+    assert json.loads(raw) == {'values': [1.5, 2.5], 'samples': [1.0, 2.0]}